@@ -11,8 +11,7 @@ import streamlit as st
 # Project root
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
-from src.llm import generate_response
-from src.retrieval import process_query
+from src.service import ServiceOverloaded, answer_blocking
 
 st.set_page_config(page_title="Medical Literature Assistant", layout="wide")
 st.title("Multimodal Medical Literature Assistant")
@@ -39,11 +38,16 @@ if st.button("Search", type="primary"):
     if not text_query and not image_query:
         st.warning("Enter a text question and/or upload an image.")
     else:
+        # Shared service bounds retrieval/LLM concurrency across all sessions
         with st.spinner("Searching literature..."):
-            results = process_query(
-                query=text_query or None,
-                query_image=image_query,
-            )
+            try:
+                results = answer_blocking(
+                    query=text_query or None,
+                    query_image=image_query,
+                )
+            except ServiceOverloaded:
+                st.error("The assistant is busy. Please try again in a moment.")
+                st.stop()
         text_results = results.get("text_results", [])
         image_results = results.get("image_results", [])
 
@@ -59,16 +63,18 @@ if st.button("Search", type="primary"):
         if image_results:
             cols = st.columns(min(3, len(image_results)))
             for i, r in enumerate(image_results[:6]):
-                path = r.get("metadata", {}).get("path")
-                if path and Path(path).exists():
-                    cols[i % 3].image(path, caption=r.get("metadata", {}).get("source_paper", path))
+                meta = r.get("metadata", {})
+                path = meta.get("path")
+                # Serve the precomputed thumbnail; fall back to the original for older indexes
+                shown = meta.get("thumb") if meta.get("thumb") and Path(meta["thumb"]).exists() else path
+                if shown and Path(shown).exists():
+                    cols[i % 3].image(shown, caption=meta.get("source_paper", path))
         else:
             st.info("No image results.")
 
         if text_query and (text_results or image_results):
             st.subheader("Answer")
-            answer = generate_response(text_query, text_results, image_results)
-            st.write(answer)
+            st.write(results.get("answer"))
         elif not text_query:
             st.info("Add a text question to get an LLM-synthesized answer.")
 
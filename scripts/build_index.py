@@ -1,75 +1,139 @@
 """
 Build Chroma index from collected papers and figures.
 Run from project root: python -m scripts.build_index
+
+With SHARD_KEY set, papers and figures are split into shard directories:
+    python -m scripts.build_index --workers 4      # build all shards in parallel
+    python -m scripts.build_index --shard h003     # build one shard (e.g. on another node)
 """
+import argparse
 import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from src.config import FIGURES_DIR, PAPERS_DIR
-from src.data_collection.pdf_extract import extract_abstract_and_methods, extract_images_from_pdf
-from src.embeddings import embed_image, embed_texts, load_image_model, load_text_model
-from src.retrieval import add_images_to_store, add_papers_to_store, get_or_create_collections
-
+from src.data_collection.figure_store import load_index as load_figure_index
+from src.indexing import figure_entry, index_figures, index_papers, index_passages, load_paper_metadata, paper_texts
+from src.retrieval import get_or_create_collections
+from src.retrieval.store import rebuild_lexical_indexes
+from src.retrieval.sharding import is_sharded, shard_for
 
-def main():
-    get_or_create_collections()
 
-    # Text: use saved abstracts or extract from PDF
+def collect_paper_texts() -> tuple[list[str], list[str], list[str]]:
+    """Paper ids, paper-level texts and passage texts: saved abstracts and/or text extracted from PDF."""
     paper_ids = []
-    paper_texts = []
+    texts = []
+    full_texts = []
+    for pdf_path in sorted(PAPERS_DIR.glob("*.pdf")):
+        text, full = paper_texts(pdf_path)
+        if not text.strip():
+            continue
+        paper_ids.append(pdf_path.stem)
+        texts.append(text)
+        full_texts.append(full)
+    # Abstracts saved without a PDF alongside
     for abstract_file in sorted(PAPERS_DIR.glob("*_abstract.txt")):
-        text = abstract_file.read_text(encoding="utf-8")
         stem = abstract_file.stem.replace("_abstract", "")
-        paper_ids.append(stem)
-        paper_texts.append(text)
-    for pdf_path in sorted(PAPERS_DIR.glob("*.pdf")):
-        stem = pdf_path.stem
         if stem in paper_ids:
             continue
-        extracted = extract_abstract_and_methods(pdf_path)
-        text = (extracted.get("abstract") or "") + "\n" + (extracted.get("methods") or "")
-        if not text.strip():
-            continue
+        text = abstract_file.read_text(encoding="utf-8")
         paper_ids.append(stem)
-        paper_texts.append(text)
+        texts.append(text)
+        full_texts.append(text)
+    return paper_ids, texts, full_texts
 
-    if not paper_ids:
-        print("No papers found. Run scripts/collect_papers.py first.")
-        return
-    print(f"Embedding {len(paper_ids)} papers...")
-    model = load_text_model()
-    embeddings = embed_texts(paper_texts, model=model)
-    metadatas = [{"source": pid} for pid in paper_ids]
-    add_papers_to_store(paper_ids, paper_texts, embeddings, metadatas)
-    print("Text index done.")
-
-    # Images: embed each figure file
-    load_image_model()
-    img_ids = []
-    img_embeddings = []
-    img_metadatas = []
+
+def collect_figures() -> list[dict]:
+    """
+    Figures from the figure store, plus loose files under FIGURES_DIR/<paper>/ from
+    older runs for papers the store has no records of.
+    """
+    records = load_figure_index()
+    stored_papers = {rec["source_paper"] for rec in records}
+    figures = [
+        figure_entry(rec)
+        for rec in records
+        if Path(rec["path"]).suffix.lower() in (".png", ".jpg", ".jpeg")
+    ]
+    if not FIGURES_DIR.is_dir():
+        return figures
     for paper_dir in sorted(FIGURES_DIR.iterdir()):
-        if not paper_dir.is_dir():
+        if not paper_dir.is_dir() or paper_dir.name in stored_papers:
             continue
-        source_paper = paper_dir.name
         for img_path in sorted(paper_dir.glob("*")):
-            if img_path.suffix.lower() not in (".png", ".jpg", ".jpeg"):
-                continue
-            try:
-                emb = embed_image(str(img_path))
-                img_ids.append(str(img_path))
-                img_embeddings.append(emb)
-                img_metadatas.append({"path": str(img_path), "source_paper": source_paper})
-            except Exception as e:
-                print(f"Skip {img_path}: {e}")
-    if img_ids:
-        print(f"Embedding {len(img_ids)} figures...")
-        add_images_to_store(img_ids, img_embeddings, img_metadatas)
-        print("Image index done.")
-    else:
-        print("No figures found under data/figures/.")
+            if img_path.suffix.lower() in (".png", ".jpg", ".jpeg"):
+                figures.append({"id": str(img_path), "path": str(img_path), "source_paper": paper_dir.name})
+    return figures
+
+
+def build_shard(shard: str, papers: list[tuple[str, str, str, dict]], figures: list[dict], paper_meta: dict):
+    """Build a single shard; runs in its own worker process."""
+    print(f"[{shard}] {len(papers)} papers, {len(figures)} figures")
+    if papers:
+        ids, texts, full_texts, metas = (list(x) for x in zip(*papers))
+        index_papers(ids, texts, metas, shard=shard)
+        index_passages(ids, full_texts, metas, shard=shard)
+    if figures:
+        index_figures(figures, paper_meta, shard=shard)
+    return shard
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed papers and figures into Chroma.")
+    parser.add_argument("--shard", help="Only build this shard (requires SHARD_KEY).")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for building shards in parallel.")
+    parser.add_argument(
+        "--rebuild-lexical", action="store_true", help="Only rebuild the BM25 indexes from the texts already in Chroma."
+    )
+    args = parser.parse_args()
+
+    if args.rebuild_lexical:
+        rebuild_lexical_indexes()
+        print("BM25 indexes rebuilt.")
+        return
+
+    paper_ids, paper_texts, full_texts = collect_paper_texts()
+    if not paper_ids:
+        print("No papers found. Run scripts/collect_papers.py first.")
+        return
+    paper_meta = {pid: load_paper_metadata(pid) for pid in paper_ids}
+    metadatas = [paper_meta[pid] for pid in paper_ids]
+    figures = collect_figures()
+
+    if not is_sharded():
+        if args.shard or args.workers > 1:
+            print("Sharding is disabled (SHARD_KEY unset); building the single store.")
+        get_or_create_collections()
+        index_papers(paper_ids, paper_texts, metadatas)
+        index_passages(paper_ids, full_texts, metadatas)
+        index_figures(figures, paper_meta)
+        return
+
+    shard_papers: dict[str, list] = defaultdict(list)
+    for pid, text, full, meta in zip(paper_ids, paper_texts, full_texts, metadatas):
+        shard_papers[shard_for(pid, meta)].append((pid, text, full, meta))
+    shard_figures: dict[str, list] = defaultdict(list)
+    for fig in figures:
+        source_paper = fig["source_paper"]
+        shard_figures[shard_for(source_paper, paper_meta.get(source_paper))].append(fig)
+
+    shards = sorted(set(shard_papers) | set(shard_figures))
+    if args.shard:
+        shards = [s for s in shards if s == args.shard]
+        if not shards:
+            print(f"No papers map to shard {args.shard}.")
+            return
+    jobs = [(s, shard_papers[s], shard_figures[s], paper_meta) for s in shards]
+    if args.workers <= 1:
+        for job in jobs:
+            build_shard(*job)
+        return
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for done in pool.map(build_shard, *zip(*jobs)):
+            print(f"Shard {done} built.")
 
 
 if __name__ == "__main__":
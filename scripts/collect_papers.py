@@ -2,6 +2,7 @@
 Collect papers: search PubMed, download PMC PDFs, extract text and figures.
 Run from project root: python -m scripts.collect_papers
 """
+import json
 import sys
 import time
 from pathlib import Path
@@ -12,7 +13,8 @@ import requests
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from src.config import DATA_DIR, FIGURES_DIR, PAPERS_DIR
-from src.data_collection.pdf_extract import extract_abstract_and_methods, extract_images_from_pdf
+from src.data_collection.figure_store import store_figures_from_pdf
+from src.data_collection.pdf_extract import extract_abstract_and_methods
 from src.data_collection.pubmed import fetch_pmc_pdf_links, fetch_pubmed_pmids
 
 
@@ -56,6 +58,12 @@ def main():
         pmc = (meta.get("pmc_id") or "").replace("PMC", "")
         fname = f"PMC{pmc}.pdf"
         out_path = PAPERS_DIR / fname
+        # Paper-level metadata (used for shard keys and filters at index time)
+        meta_path = PAPERS_DIR / f"PMC{pmc}_meta.json"
+        meta_path.write_text(
+            json.dumps({k: meta.get(k) for k in ("pmid", "pmc_id", "title", "year")}),
+            encoding="utf-8",
+        )
         if out_path.exists():
             print(f"Skip (exists): {fname}")
             continue
@@ -75,8 +83,8 @@ def main():
         abstract_path = PAPERS_DIR / f"{stem}_abstract.txt"
         if text.get("abstract"):
             abstract_path.write_text(text["abstract"], encoding="utf-8")
-        fig_dir = FIGURES_DIR / stem
-        extract_images_from_pdf(pdf_path, output_dir=fig_dir)
+        # Figures go to the content-addressed store (with thumbnails), streamed one at a time
+        store_figures_from_pdf(pdf_path)
     print("Done.")
 
 
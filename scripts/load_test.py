@@ -0,0 +1,211 @@
+"""
+Offline load test for the query service: N concurrent users against a synthetic
+index, running the real retrieval path (`process_query` with the sharding,
+passage, hybrid, rerank and filter settings from .env) with only the embedders
+and the LLM stubbed. Reports throughput, tail latency and where the service
+saturates.
+Run from project root: python -m scripts.load_test --users 1,4,16,64 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# src is imported inside main(), once the store has been pointed at a temp directory
+
+VOCAB = [f"w{i}" for i in range(20000)]
+
+
+def _unit_vectors(rng: np.random.Generator, n: int, dim: int) -> list[list[float]]:
+    vecs = rng.standard_normal((n, dim)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    return vecs.tolist()
+
+
+def synthetic_text(rng: np.random.Generator, n_words: int) -> str:
+    """Zipf-distributed words, so BM25 sees realistic posting-list lengths."""
+    idx = np.minimum(rng.zipf(1.3, n_words), len(VOCAB)) - 1
+    return " ".join(VOCAB[i] for i in idx)
+
+
+def build_synthetic_index(n_papers: int, dim: int, passages_per_paper: int, seed: int) -> None:
+    """
+    Index `n_papers` synthetic papers (random unit vectors standing in for SPECTER
+    embeddings, a year for filters) and their passages through the same
+    add_*_to_store calls build_index uses, so shards and BM25 indexes are built too.
+    """
+    from src.retrieval import add_papers_to_store, add_passages_to_store
+
+    rng = np.random.default_rng(seed)
+    batch = 1000  # x passages_per_paper must stay under Chroma's max batch size
+    for offset in range(0, n_papers, batch):
+        n = min(batch, n_papers - offset)
+        ids = [f"SYN{offset + i}" for i in range(n)]
+        metas = [{"source": pid, "year": int(rng.integers(2000, 2025))} for pid in ids]
+        texts = [synthetic_text(rng, 150) for _ in ids]
+        add_papers_to_store(ids, texts, _unit_vectors(rng, n, dim), metas)
+        if not passages_per_paper:
+            continue
+        p_ids, p_texts, p_metas = [], [], []
+        for pid, text, meta in zip(ids, texts, metas):
+            words = text.split()
+            step = -(-len(words) // passages_per_paper)
+            for c in range(passages_per_paper):
+                p_ids.append(f"{pid}#c{c}")
+                p_texts.append(" ".join(words[c * step:(c + 1) * step]))
+                p_metas.append({**meta, "chunk": c, "n_chunks": passages_per_paper})
+        add_passages_to_store(p_ids, p_texts, _unit_vectors(rng, len(p_ids), dim), p_metas)
+
+
+def stub_embedders(dim: int, embed_ms: float) -> None:
+    """Replace query embedding with a simulated delay + random unit vector; the rest of process_query runs as is."""
+    import src.retrieval.query as query_module
+
+    def embed(_query, *args, **kwargs):
+        time.sleep(embed_ms / 1000)
+        v = np.random.standard_normal(dim).astype(np.float32)
+        return (v / np.linalg.norm(v)).tolist()
+
+    query_module.embed_query_text = embed
+    query_module.embed_query_image = embed
+
+
+def synthetic_query(rng: random.Random) -> str:
+    return " ".join(VOCAB[min(int(rng.paretovariate(0.3)), len(VOCAB)) - 1] for _ in range(rng.randint(2, 4)))
+
+
+def make_generate(llm_ms: float):
+    """generate_response stand-in: log-normal latency around `llm_ms`, like a remote LLM."""
+    def generate(query, text_results, image_results):
+        time.sleep(random.lognormvariate(0, 0.3) * llm_ms / 1000)
+        return f"Stub answer citing {len(text_results)} papers."
+    return generate
+
+
+async def run_level(service, users: int, duration: float, think_ms: float, where: dict | None = None) -> dict:
+    """Closed-loop users: each sends a request, waits for it, thinks, repeats."""
+    from src.service import ServiceOverloaded
+
+    latencies: list[float] = []
+    rejected = 0
+    deadline = time.perf_counter() + duration
+
+    async def user(seed: int):
+        nonlocal rejected
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            try:
+                res = await service.answer(query=synthetic_query(rng), where=where)
+                latencies.append(res["timings"]["total_s"])
+            except ServiceOverloaded:
+                rejected += 1
+            await asyncio.sleep(random.expovariate(1 / think_ms) / 1000 if think_ms else 0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(users)))
+    elapsed = time.perf_counter() - start
+    lat = np.asarray(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "users": users,
+        "completed": len(latencies),
+        "rejected": rejected,
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "p99_ms": float(np.percentile(lat, 99)),
+    }
+
+
+def find_saturation(rows: list[dict], min_gain: float = 0.1, max_p95_growth: float = 2.0) -> dict | None:
+    """
+    Last level before saturation: the next level either raises throughput by less
+    than `min_gain` or pushes p95 past `max_p95_growth` x the lightest level's p95.
+    """
+    if not rows:
+        return None
+    base_p95 = rows[0]["p95_ms"]
+    for prev, cur in zip(rows, rows[1:]):
+        if cur["throughput"] < prev["throughput"] * (1 + min_gain) or cur["p95_ms"] > base_p95 * max_p95_growth:
+            return prev
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the query service offline.")
+    parser.add_argument("--users", default="1,2,4,8,16,32,64")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per load level.")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Mean think time between a user's requests.")
+    parser.add_argument("--papers", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--passages-per-paper", type=int, default=3, help="0 to index papers only.")
+    parser.add_argument("--where", type=json.loads, default=None, help='Metadata filter, e.g. \'{"year": {"$gte": 2020}}\'.')
+    parser.add_argument("--embed-ms", type=float, default=15.0, help="Simulated query embedding time.")
+    parser.add_argument("--llm-ms", type=float, default=800.0, help="Median stubbed LLM latency.")
+    parser.add_argument("--retrieval-concurrency", type=int, default=None)
+    parser.add_argument("--generation-concurrency", type=int, default=None)
+    parser.add_argument("--max-pending", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    service_kwargs = {
+        k: v for k, v in {
+            "retrieval_concurrency": args.retrieval_concurrency,
+            "generation_concurrency": args.generation_concurrency,
+            "max_pending": args.max_pending,
+        }.items() if v is not None
+    }
+    tmp = Path(tempfile.mkdtemp(prefix="load_test_"))
+    # Must happen before src.config is imported; other settings keep their .env values
+    os.environ.update({
+        "CHROMA_PERSIST_DIR": str(tmp / "chroma"),
+        "CHROMA_SHARDS_DIR": str(tmp / "chroma" / "shards"),
+        "CHROMA_EXTRA_SHARDS": "",
+        "INDEX_SNAPSHOT_DIR": "",
+    })
+    from src import config
+    from src.service import QueryService
+
+    try:
+        print(
+            f"Building synthetic index: {args.papers} papers x {args.passages_per_paper} passages, dim {args.dim} "
+            f"(shards={config.SHARD_KEY or 'off'} passages={config.USE_PASSAGES} "
+            f"hybrid={config.USE_HYBRID} rerank={config.RERANK_ENABLED and config.RERANKER})..."
+        )
+        build_synthetic_index(args.papers, args.dim, args.passages_per_paper, args.seed)
+        stub_embedders(args.dim, args.embed_ms)
+        generate = make_generate(args.llm_ms)
+
+        rows = []
+        print(f"{'users':>6} {'done':>6} {'rej':>5} {'req/s':>8} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8}")
+        for users in (int(u) for u in args.users.split(",") if u):
+            # Fresh service per level so semaphores and counters start clean
+            service = QueryService(generate=generate, watch_papers=False, **service_kwargs)
+            row = asyncio.run(run_level(service, users, args.duration, args.think_ms, args.where))
+            service.close()
+            rows.append(row)
+            print(
+                f"{row['users']:>6} {row['completed']:>6} {row['rejected']:>5} {row['throughput']:>8.2f} "
+                f"{row['p50_ms']:>8.0f} {row['p95_ms']:>8.0f} {row['p99_ms']:>8.0f}"
+            )
+
+        sat = find_saturation(rows)
+        if sat:
+            print(f"\nSaturates at ~{sat['users']} users ({sat['throughput']:.2f} req/s, p95 {sat['p95_ms']:.0f} ms).")
+        else:
+            print("\nNo saturation within the tested levels.")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
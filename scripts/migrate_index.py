@@ -0,0 +1,30 @@
+"""
+Rebuild existing collections with the configured distance metric and HNSW settings.
+Run from project root: python -m scripts.migrate_index
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import CHROMA_DIR, DISTANCE_METRIC, HNSW_CONSTRUCTION_EF, HNSW_M, HNSW_SEARCH_EF
+from src.retrieval.sharding import is_sharded, list_shards
+from src.retrieval.store import migrate_collections
+
+
+def main():
+    print(
+        f"Target: space={DISTANCE_METRIC} M={HNSW_M} "
+        f"construction_ef={HNSW_CONSTRUCTION_EF} search_ef={HNSW_SEARCH_EF}"
+    )
+    paths = list(list_shards().values()) if is_sharded() else [Path(CHROMA_DIR)]
+    for path in paths:
+        migrated = migrate_collections(path)
+        if migrated:
+            print(f"{path}: migrated {', '.join(migrated)}")
+        else:
+            print(f"{path}: up to date")
+
+
+if __name__ == "__main__":
+    main()
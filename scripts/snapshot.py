@@ -0,0 +1,183 @@
+"""
+Export / import a portable snapshot of all collections (embeddings, ids, documents, metadata).
+Run from project root:
+    python -m scripts.snapshot export data/snapshots/2026-10-19
+    python -m scripts.snapshot verify data/snapshots/2026-10-19
+    python -m scripts.snapshot import data/snapshots/2026-10-19
+
+For a read-only replica, skip the import and point INDEX_SNAPSHOT_DIR at the
+snapshot; queries are then served from the memory-mapped embeddings.
+"""
+import argparse
+import json
+import shutil
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import DISTANCE_METRIC
+from src.retrieval import add_images_to_store, add_papers_to_store, add_passages_to_store
+from src.retrieval.lexical import LexicalIndex, lexical_index_path, write_lexical_file
+from src.retrieval.sharding import is_sharded, list_shards
+from src.retrieval.snapshot import (
+    SnapshotError,
+    collection_index,
+    iter_records,
+    read_manifest,
+    write_collection,
+    write_manifest,
+)
+from src.retrieval.store import (
+    IMAGE_COLLECTION_NAME,
+    PASSAGE_COLLECTION_NAME,
+    TEXT_COLLECTION_NAME,
+    copy_lexical_index,
+    get_or_create_collections,
+    get_passage_collection,
+    index_settings,
+)
+
+
+def _chroma_collections() -> list[tuple]:
+    """(text, image, passages) triples from Chroma itself, across all shards."""
+    paths = list(list_shards().values()) if is_sharded() else [None]
+    return [(*get_or_create_collections(p), get_passage_collection(p)) for p in paths]
+
+
+def _batches(collections: list, include: list[str], batch_size: int):
+    for coll in collections:
+        for offset in range(0, coll.count(), batch_size):
+            batch = coll.get(offset=offset, limit=batch_size, include=include)
+            if not batch["ids"]:
+                break
+            yield batch
+
+
+def _index_entry(name: str, colls: list) -> dict:
+    """The metric and HNSW settings a collection's shards were built with; they must all agree."""
+    found = [index_settings(c) for c in colls]
+    if any(settings != found[0] for settings in found):
+        raise SnapshotError(
+            f"{name}: shards have different index settings ({found}); run scripts.migrate_index and export again"
+        )
+    return {
+        "distance_metric": found[0]["hnsw:space"],
+        "hnsw_m": found[0]["hnsw:M"],
+        "hnsw_construction_ef": found[0]["hnsw:construction_ef"],
+        "hnsw_search_ef": found[0]["hnsw:search_ef"],
+    }
+
+
+def _export_collection(out_dir: Path, name: str, colls: list, include: list[str], batch_size: int, attempts: int = 3) -> dict:
+    """
+    Export one collection, retrying if writers changed it while it was paged
+    through (counts moved, or the written files don't line up).
+    """
+    index = _index_entry(name, colls)
+    for _ in range(attempts):
+        before = [c.count() for c in colls]
+        try:
+            entry = write_collection(out_dir, name, sum(before), _batches(colls, include, batch_size))
+        except SnapshotError as e:
+            print(f"  {e}; retrying...")
+            continue
+        if [c.count() for c in colls] == before and entry["count"] == sum(before):
+            return {**entry, "index": index}
+        print(f"  {name} changed during export; retrying...")
+    raise SnapshotError(
+        f"{name} kept changing during export; pause writers (watcher, build_index) and export again"
+    )
+
+
+def _write_lexical_index(out_dir: Path, name: str, entry: dict) -> str:
+    """BM25 index built from exactly the records exported for a collection; returns its file name."""
+    files = entry["files"]
+    ids = json.loads((out_dir / files["ids"]).read_text(encoding="utf-8"))
+    documents = json.loads((out_dir / files["documents"]).read_text(encoding="utf-8")) if "documents" in files else []
+    metadatas = json.loads((out_dir / files["metadatas"]).read_text(encoding="utf-8"))
+    path = lexical_index_path(out_dir, name)
+    write_lexical_file(path, ids, documents, metadatas)
+    return path.name
+
+
+def export_snapshot(out_dir: Path, batch_size: int) -> None:
+    tmp = out_dir.with_name(out_dir.name + ".partial")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    pairs = _chroma_collections()
+    entries = {}
+    for name, idx, include in (
+        (TEXT_COLLECTION_NAME, 0, ["embeddings", "documents", "metadatas"]),
+        (IMAGE_COLLECTION_NAME, 1, ["embeddings", "metadatas"]),
+        (PASSAGE_COLLECTION_NAME, 2, ["embeddings", "documents", "metadatas"]),
+    ):
+        colls = [pair[idx] for pair in pairs]
+        print(f"Exporting {name}: {sum(c.count() for c in colls)} records...")
+        entries[name] = _export_collection(tmp, name, colls, include, batch_size)
+    # BM25 indexes ride along so a replica serving this snapshot keeps hybrid search
+    extra = [_write_lexical_index(tmp, name, entries[name]) for name in (TEXT_COLLECTION_NAME, PASSAGE_COLLECTION_NAME)]
+    write_manifest(tmp, entries, extra)
+    # Publish atomically so readers never see a half-written snapshot
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    tmp.rename(out_dir)
+    print(f"Snapshot written to {out_dir}")
+
+
+def import_snapshot(snapshot_dir: Path, batch_size: int) -> None:
+    manifest = read_manifest(snapshot_dir, verify=True)
+    for name in manifest["collections"]:
+        metric = collection_index(manifest, name)["distance_metric"]
+        if metric != DISTANCE_METRIC:
+            print(
+                f"Note: {name} was built with {metric} distance; "
+                f"importing into collections configured for {DISTANCE_METRIC}."
+            )
+    # Shipped BM25 indexes (checked above) are copied once after the records instead of rebuilt batch by batch
+    shipped = {
+        name for name in (TEXT_COLLECTION_NAME, PASSAGE_COLLECTION_NAME)
+        if lexical_index_path(snapshot_dir, name).name in manifest.get("extra_files", {})
+    }
+    start = time.perf_counter()
+    for batch in iter_records(snapshot_dir, TEXT_COLLECTION_NAME, manifest, batch_size):
+        add_papers_to_store(
+            batch["ids"], batch["documents"], batch["embeddings"], batch["metadatas"],
+            lexical=TEXT_COLLECTION_NAME not in shipped,
+        )
+    for batch in iter_records(snapshot_dir, IMAGE_COLLECTION_NAME, manifest, batch_size):
+        add_images_to_store(batch["ids"], batch["embeddings"], batch["metadatas"])
+    if PASSAGE_COLLECTION_NAME in manifest["collections"]:
+        for batch in iter_records(snapshot_dir, PASSAGE_COLLECTION_NAME, manifest, batch_size):
+            add_passages_to_store(
+                batch["ids"], batch["documents"], batch["embeddings"], batch["metadatas"],
+                lexical=PASSAGE_COLLECTION_NAME not in shipped,
+            )
+    for name in sorted(shipped):
+        index = LexicalIndex(lexical_index_path(snapshot_dir, name), readonly=True)
+        index.refresh()
+        copy_lexical_index(index, name)
+    counts = {n: c["count"] for n, c in manifest["collections"].items()}
+    print(f"Imported {counts} in {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, verify or import an index snapshot.")
+    parser.add_argument("action", choices=["export", "import", "verify"])
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.action == "export":
+        export_snapshot(args.path, args.batch_size)
+    elif args.action == "import":
+        import_snapshot(args.path, args.batch_size)
+    else:
+        manifest = read_manifest(args.path, verify=True)
+        counts = {n: c["count"] for n, c in manifest["collections"].items()}
+        print(f"OK: {counts}, models {manifest['models']}, created {manifest['created']}")
+
+
+if __name__ == "__main__":
+    main()
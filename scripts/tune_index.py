@@ -0,0 +1,183 @@
+"""
+Sweep distance metric and HNSW parameters on the live corpus and report the
+recall@k vs. query latency vs. index size frontier, against exact search.
+Run from project root: python -m scripts.tune_index [--collection images] [--m 8,16,32]
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from itertools import product
+from pathlib import Path
+
+import chromadb
+import numpy as np
+from chromadb.api.shared_system_client import SharedSystemClient
+from chromadb.config import Settings
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.retrieval.store import (
+    IMAGE_COLLECTION_NAME,
+    TEXT_COLLECTION_NAME,
+    hnsw_metadata,
+    iter_collections,
+    set_search_ef,
+)
+
+
+def _ints(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def load_corpus(kind: str, limit: int, batch_size: int = 1000) -> np.ndarray:
+    """Up to `limit` embeddings from the live text or image collections (all shards)."""
+    vectors = []
+    for text_coll, image_coll in iter_collections():
+        coll = text_coll if kind == "text" else image_coll
+        for offset in range(0, coll.count(), batch_size):
+            batch = coll.get(offset=offset, limit=batch_size, include=["embeddings"])
+            vectors.extend(batch["embeddings"])
+            if len(vectors) >= limit:
+                return np.asarray(vectors[:limit], dtype=np.float32)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def exact_neighbors(corpus: np.ndarray, queries: np.ndarray, space: str, k: int) -> np.ndarray:
+    """Brute-force top-k indices under the given Chroma distance space."""
+    if space == "cosine":
+        c = corpus / np.linalg.norm(corpus, axis=1, keepdims=True).clip(1e-12)
+        q = queries / np.linalg.norm(queries, axis=1, keepdims=True).clip(1e-12)
+        dist = -q @ c.T
+    elif space == "ip":
+        dist = -queries @ corpus.T
+    else:
+        dist = (queries ** 2).sum(1)[:, None] - 2 * queries @ corpus.T + (corpus ** 2).sum(1)[None, :]
+    top = np.argpartition(dist, k - 1, axis=1)[:, :k]
+    return top
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _close(client) -> None:
+    """Release a client's system; Chroma otherwise keeps every throwaway index in memory."""
+    if hasattr(client, "close"):
+        client.close()
+    else:
+        client._system.stop()
+        SharedSystemClient.clear_system_cache()
+
+
+def _open(path: Path):
+    return chromadb.PersistentClient(path=str(path), settings=Settings(anonymized_telemetry=False))
+
+
+def evaluate_build(corpus, queries, truth, space, m, construction_ef, search_efs, k, batch_size=1000) -> list[dict]:
+    """
+    Build a throwaway collection with these graph settings and measure it at
+    each query-time ef. The graph is built once; ef is changed in place and
+    takes effect when the collection is reopened by a new client.
+    """
+    tmp = Path(tempfile.mkdtemp(prefix="tune_index_"))
+    client = _open(tmp)
+    try:
+        coll = client.create_collection("tune", metadata=hnsw_metadata(space, m, construction_ef, search_efs[0]))
+        ids = [str(i) for i in range(len(corpus))]
+        start = time.perf_counter()
+        for offset in range(0, len(corpus), batch_size):
+            coll.add(ids=ids[offset:offset + batch_size], embeddings=corpus[offset:offset + batch_size].tolist())
+        build_s = time.perf_counter() - start
+        size_mb = _dir_size(tmp) / 1e6
+
+        rows = []
+        for search_ef in search_efs:
+            if not set_search_ef(coll, search_ef):
+                print(f"  This Chroma can't change ef_search in place; skipping search_ef={search_ef}")
+                continue
+            _close(client)
+            client = _open(tmp)
+            coll = client.get_collection("tune")
+            latencies = []
+            hits = 0
+            for q, expected in zip(queries, truth):
+                start = time.perf_counter()
+                res = coll.query(query_embeddings=[q.tolist()], n_results=k, include=[])
+                latencies.append(time.perf_counter() - start)
+                hits += len({int(i) for i in res["ids"][0]} & set(expected.tolist()))
+            rows.append({
+                "space": space,
+                "M": m,
+                "construction_ef": construction_ef,
+                "search_ef": search_ef,
+                "recall": hits / (len(queries) * k),
+                "p50_ms": float(np.percentile(latencies, 50) * 1000),
+                "p95_ms": float(np.percentile(latencies, 95) * 1000),
+                "build_s": build_s,
+                "size_mb": size_mb,
+            })
+        return rows
+    finally:
+        _close(client)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def pareto_frontier(rows: list[dict]) -> list[dict]:
+    """Rows not dominated on (higher recall, lower p95 latency, smaller index)."""
+    def dominates(a, b):
+        better_or_equal = a["recall"] >= b["recall"] and a["p95_ms"] <= b["p95_ms"] and a["size_mb"] <= b["size_mb"]
+        strictly = a["recall"] > b["recall"] or a["p95_ms"] < b["p95_ms"] or a["size_mb"] < b["size_mb"]
+        return better_or_equal and strictly
+
+    return [r for r in rows if not any(dominates(o, r) for o in rows if o is not r)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep HNSW parameters against exact search.")
+    parser.add_argument("--collection", choices=["text", "images"], default="text")
+    parser.add_argument("--spaces", default="cosine,l2")
+    parser.add_argument("--m", default="8,16,32")
+    parser.add_argument("--construction-ef", default="64,100,200")
+    parser.add_argument("--search-ef", default="10,50,100")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--sample", type=int, default=20000, help="Max corpus vectors to index.")
+    parser.add_argument("--queries", type=int, default=200, help="Held-out vectors used as queries.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    kind = "text" if args.collection == "text" else "image"
+    name = TEXT_COLLECTION_NAME if kind == "text" else IMAGE_COLLECTION_NAME
+    vectors = load_corpus(kind, args.sample + args.queries)
+    if len(vectors) <= args.queries + args.k:
+        print(f"Not enough vectors in {name} ({len(vectors)}). Build the index first.")
+        return
+    rng = np.random.default_rng(args.seed)
+    order = rng.permutation(len(vectors))
+    queries, corpus = vectors[order[:args.queries]], vectors[order[args.queries:]]
+    print(f"{name}: {len(corpus)} indexed vectors, {len(queries)} held-out queries, k={args.k}")
+
+    rows = []
+    spaces = [s for s in args.spaces.split(",") if s]
+    for space in spaces:
+        truth = exact_neighbors(corpus, queries, space, args.k)
+        for m, ef_c in product(_ints(args.m), _ints(args.construction_ef)):
+            for row in evaluate_build(corpus, queries, truth, space, m, ef_c, _ints(args.search_ef), args.k):
+                rows.append(row)
+                print(
+                    f"  {space:6} M={m:<3} ef_c={ef_c:<4} ef_s={row['search_ef']:<4} "
+                    f"recall@{args.k}={row['recall']:.3f} p50={row['p50_ms']:.2f}ms "
+                    f"p95={row['p95_ms']:.2f}ms build={row['build_s']:.1f}s size={row['size_mb']:.1f}MB"
+                )
+
+    print("\nFrontier (recall vs. p95 latency vs. size):")
+    for r in sorted(pareto_frontier(rows), key=lambda r: -r["recall"]):
+        print(
+            f"  HNSW_M={r['M']} HNSW_CONSTRUCTION_EF={r['construction_ef']} HNSW_SEARCH_EF={r['search_ef']} "
+            f"DISTANCE_METRIC={r['space']}  recall={r['recall']:.3f} p95={r['p95_ms']:.2f}ms size={r['size_mb']:.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Watch PAPERS_DIR and index new or changed PDFs (text + figures) as they arrive.
+
+Polls the directory, waits until a file has been unchanged for the debounce
+window (so half-copied PDFs and bursts of arrivals are handled together), then
+hands ready files to a background worker that extracts, embeds and upserts them.
+
+Chroma searches in one process don't see vectors another process upserts, so
+to make new papers searchable in the running app, set SERVICE_WATCH_PAPERS=1
+and the query service runs this watcher in the app's own process. Standalone:
+    python -m scripts.watch_index
+indexes into the store, but a separately running app only finds the new papers
+after a restart.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import PAPERS_DIR, WATCH_DEBOUNCE_SECONDS, WATCH_POLL_INTERVAL
+from src.indexing import PaperWatcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Continuously index new PDFs in PAPERS_DIR.")
+    parser.add_argument("--poll-interval", type=float, default=WATCH_POLL_INTERVAL)
+    parser.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE_SECONDS)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--reindex", action="store_true", help="Ignore saved state and index every PDF once.")
+    args = parser.parse_args()
+
+    PAPERS_DIR.mkdir(parents=True, exist_ok=True)
+    watcher = PaperWatcher(poll_interval=args.poll_interval, debounce=args.debounce, batch_size=args.batch_size)
+    if args.reindex:
+        watcher.indexed.clear()
+    watcher.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,11 @@ PROJECT_ROOT = Path(__file__).resolve().parent.parent
 DATA_DIR = PROJECT_ROOT / "data"
 PAPERS_DIR = DATA_DIR / "papers"
 FIGURES_DIR = DATA_DIR / "figures"
+# Content-addressed figure blobs, thumbnails and their index
+FIGURE_STORE_DIR = DATA_DIR / "figure_store"
 CHROMA_DIR = os.environ.get("CHROMA_PERSIST_DIR") or str(DATA_DIR / "chroma")
+# Serve queries read-only from an exported snapshot (mmap) instead of Chroma
+INDEX_SNAPSHOT_DIR = os.environ.get("INDEX_SNAPSHOT_DIR", "")
 
 # PubMed
 PUBMED_EMAIL = os.environ.get("PUBMED_EMAIL", "")
@@ -24,6 +28,60 @@ TEXT_EMBEDDING_MODEL = "allenai/specter"
 IMAGE_EMBEDDING_MODEL = "openai/clip-vit-base-patch32"
 LLM_MODEL = "gpt-4"
 
+# Longest side (px) of figure thumbnails served by the UI
+THUMBNAIL_SIZE = int(os.environ.get("THUMBNAIL_SIZE", "320"))
+
 # Retrieval
 DEFAULT_TOP_K_TEXT = 5
 DEFAULT_TOP_K_IMAGES = 5
+
+# Passage index: token-bounded overlapping chunks of abstract + methods
+USE_PASSAGES = os.environ.get("USE_PASSAGES", "1") == "1"
+PASSAGE_MAX_TOKENS = int(os.environ.get("PASSAGE_MAX_TOKENS", "256"))
+PASSAGE_OVERLAP_TOKENS = int(os.environ.get("PASSAGE_OVERLAP_TOKENS", "64"))
+PASSAGE_AGGREGATION = os.environ.get("PASSAGE_AGGREGATION", "max")  # "max" or "sum"
+PASSAGE_OVERFETCH = int(os.environ.get("PASSAGE_OVERFETCH", "4"))  # passage hits per requested paper
+PASSAGES_PER_PAPER = int(os.environ.get("PASSAGES_PER_PAPER", "3"))  # passages passed to the LLM per paper
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "32"))
+
+# Hybrid retrieval: BM25 inverted index fused with vector results by reciprocal rank fusion
+USE_HYBRID = os.environ.get("USE_HYBRID", "1") == "1"
+RRF_K = int(os.environ.get("RRF_K", "60"))
+
+# Second-stage reranking of text results: "cross-encoder" or "cosine" (exact, on stored vectors)
+RERANK_ENABLED = os.environ.get("RERANK_ENABLED", "0") == "1"
+RERANKER = os.environ.get("RERANKER", "cross-encoder")
+RERANK_MODEL = os.environ.get("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.environ.get("RERANK_CANDIDATES", "50"))
+RERANK_BUDGET_MS = float(os.environ.get("RERANK_BUDGET_MS", "150"))
+RERANK_CACHE_SIZE = int(os.environ.get("RERANK_CACHE_SIZE", "10000"))
+# Scoring jobs that may wait behind the running one; further requests skip reranking
+RERANK_MAX_QUEUED = int(os.environ.get("RERANK_MAX_QUEUED", "1"))
+
+# Vector index (HNSW). Existing collections keep the settings they were created with;
+# run `python -m scripts.migrate_index` after changing these (search_ef is updated in place).
+DISTANCE_METRIC = os.environ.get("DISTANCE_METRIC", "cosine")  # "cosine", "l2" or "ip"
+HNSW_M = int(os.environ.get("HNSW_M", "16"))
+HNSW_CONSTRUCTION_EF = int(os.environ.get("HNSW_CONSTRUCTION_EF", "100"))
+HNSW_SEARCH_EF = int(os.environ.get("HNSW_SEARCH_EF", "100"))  # Chroma 1.x default
+
+# Sharding: "" keeps a single store; "year" or "hash" splits collections across shard directories
+SHARD_KEY = os.environ.get("SHARD_KEY", "").strip().lower()
+NUM_SHARDS = int(os.environ.get("NUM_SHARDS", "16"))
+SHARDS_DIR = os.environ.get("CHROMA_SHARDS_DIR") or str(Path(CHROMA_DIR) / "shards")
+# Extra shard directories (built elsewhere) to mount, separated by os.pathsep
+EXTRA_SHARD_DIRS = [p for p in os.environ.get("CHROMA_EXTRA_SHARDS", "").split(os.pathsep) if p]
+SHARD_QUERY_WORKERS = int(os.environ.get("SHARD_QUERY_WORKERS", "8"))
+
+# Query service: concurrent requests per stage, and how many may wait for admission
+SERVICE_RETRIEVAL_CONCURRENCY = int(os.environ.get("SERVICE_RETRIEVAL_CONCURRENCY", "8"))
+SERVICE_GENERATION_CONCURRENCY = int(os.environ.get("SERVICE_GENERATION_CONCURRENCY", "4"))
+SERVICE_MAX_PENDING = int(os.environ.get("SERVICE_MAX_PENDING", "64"))
+SERVICE_ADMISSION_TIMEOUT = float(os.environ.get("SERVICE_ADMISSION_TIMEOUT", "5"))
+
+# Watch-mode indexer: poll interval and how long a file must be unchanged before indexing
+WATCH_POLL_INTERVAL = float(os.environ.get("WATCH_POLL_INTERVAL", "1.0"))
+WATCH_DEBOUNCE_SECONDS = float(os.environ.get("WATCH_DEBOUNCE_SECONDS", "2.0"))
+# Run the watcher inside the serving process. Chroma doesn't show vectors added by
+# another process to this one's searches, so this is how new PDFs become searchable live.
+SERVICE_WATCH_PAPERS = os.environ.get("SERVICE_WATCH_PAPERS", "0") == "1"
@@ -1,9 +1,13 @@
 from .pubmed import fetch_pubmed_pmids, fetch_pmc_pdf_links
-from .pdf_extract import extract_abstract_and_methods, extract_images_from_pdf
+from .pdf_extract import extract_abstract_and_methods, extract_images_from_pdf, iter_images_from_pdf
+from .figure_store import load_index as load_figure_index, store_figures_from_pdf
 
 __all__ = [
     "fetch_pubmed_pmids",
     "fetch_pmc_pdf_links",
     "extract_abstract_and_methods",
     "extract_images_from_pdf",
+    "iter_images_from_pdf",
+    "load_figure_index",
+    "store_figures_from_pdf",
 ]
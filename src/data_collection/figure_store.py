@@ -0,0 +1,145 @@
+"""Content-addressed figure store: hash-named blobs, thumbnails and a JSONL index.
+
+Layout under FIGURE_STORE_DIR:
+    objects/ab/<sha256>.<ext>   original image bytes (identical figures stored once)
+    thumbs/ab/<sha256>.jpg      downscaled copy served by the UI
+    index.jsonl                 one record per (paper, page, image) occurrence; a
+                                {"replace": <paper>} line drops that paper's earlier
+                                records (written when a PDF is re-extracted)
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+from src.config import FIGURE_STORE_DIR, THUMBNAIL_SIZE
+from src.data_collection.pdf_extract import iter_images_from_pdf
+
+_index_lock = threading.Lock()
+
+
+def _store_dir(store_dir: Optional[str | Path]) -> Path:
+    return Path(store_dir) if store_dir else FIGURE_STORE_DIR
+
+
+def blob_path(digest: str, ext: str, store_dir: Optional[str | Path] = None) -> Path:
+    return _store_dir(store_dir) / "objects" / digest[:2] / f"{digest}.{ext}"
+
+
+def thumbnail_path(digest: str, store_dir: Optional[str | Path] = None) -> Path:
+    return _store_dir(store_dir) / "thumbs" / digest[:2] / f"{digest}.jpg"
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+
+
+def make_thumbnail(data: bytes, size: int = THUMBNAIL_SIZE) -> bytes:
+    """JPEG thumbnail whose longest side is at most `size` pixels."""
+    with Image.open(io.BytesIO(data)) as img:
+        img = img.convert("RGB")
+        img.thumbnail((size, size))
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=85)
+    return out.getvalue()
+
+
+def put_figure(
+    data: bytes,
+    ext: str,
+    source_paper: str,
+    page: int,
+    index: int,
+    width: int = 0,
+    height: int = 0,
+    store_dir: Optional[str | Path] = None,
+) -> dict:
+    """
+    Store one figure (deduplicated by content hash), write its thumbnail and
+    append an index record. Returns the record.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    blob = blob_path(digest, ext, store_dir)
+    if not blob.exists():
+        _write_atomic(blob, data)
+    thumb = thumbnail_path(digest, store_dir)
+    if not thumb.exists():
+        try:
+            _write_atomic(thumb, make_thumbnail(data))
+        except Exception:
+            thumb = None
+    record = {
+        "sha256": digest,
+        "path": str(blob),
+        "thumb": str(thumb) if thumb else None,
+        "source_paper": source_paper,
+        "page": page,
+        "index": index,
+        "width": width,
+        "height": height,
+    }
+    _append_index(record, store_dir)
+    return record
+
+
+def _append_index(entry: dict, store_dir: Optional[str | Path] = None) -> None:
+    index_path = _store_dir(store_dir) / "index.jsonl"
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    with _index_lock, open(index_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def store_figures_from_pdf(
+    pdf_path: str | Path,
+    min_width: int = 100,
+    min_height: int = 100,
+    store_dir: Optional[str | Path] = None,
+) -> list[dict]:
+    """
+    Stream a PDF's figures into the store one at a time. The paper's records from
+    any earlier extraction are replaced. Returns index records (no bytes).
+    """
+    _append_index({"replace": Path(pdf_path).stem}, store_dir)
+    return [
+        put_figure(
+            fig["image"],
+            fig["ext"],
+            fig["source_paper"],
+            fig["page"],
+            fig["index"],
+            fig["width"],
+            fig["height"],
+            store_dir=store_dir,
+        )
+        for fig in iter_images_from_pdf(pdf_path, min_width=min_width, min_height=min_height)
+    ]
+
+
+def load_index(store_dir: Optional[str | Path] = None) -> list[dict]:
+    """Current figure records: latest extraction of each paper, latest record per (paper, page, index)."""
+    index_path = _store_dir(store_dir) / "index.jsonl"
+    if not index_path.exists():
+        return []
+    by_paper: dict[str, dict[tuple, dict]] = {}
+    with open(index_path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn write from an interrupted run
+            if "replace" in rec:
+                by_paper.pop(rec["replace"], None)
+                continue
+            by_paper.setdefault(rec["source_paper"], {})[(rec["page"], rec["index"])] = rec
+    return [rec for records in by_paper.values() for rec in records.values()]
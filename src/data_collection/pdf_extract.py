@@ -1,6 +1,6 @@
 """Extract text (abstract, methods) and images from PDFs."""
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
 import fitz  # PyMuPDF
 import pdfplumber
@@ -63,29 +63,20 @@ def _extract_section(text: str, section: str) -> Optional[str]:
     return text[start_idx : start_idx + end_idx].strip()
 
 
-def extract_images_from_pdf(
+def iter_images_from_pdf(
     pdf_path: str | Path,
-    output_dir: Optional[str | Path] = None,
     min_width: int = 100,
     min_height: int = 100,
-) -> list[dict]:
+) -> Iterator[dict]:
     """
-    Extract embedded images from PDF. Optionally save to output_dir.
-    Returns list of {"image": bytes, "page": int, "index": int, "path": str | None}.
+    Yield embedded images one at a time, so only one image's bytes are held in memory.
+    Yields {"image": bytes, "ext": str, "width": int, "height": int, "page": int, "index": int, "source_paper": str}.
     """
     path = Path(pdf_path)
     if not path.exists():
-        return []
-
-    out_dir = Path(output_dir) if output_dir else None
-    if out_dir:
-        out_dir.mkdir(parents=True, exist_ok=True)
-
-    results = []
-    doc = fitz.open(path)
+        return
     stem = path.stem
-
-    try:
+    with fitz.open(path) as doc:
         for page_num in range(len(doc)):
             page = doc[page_num]
             image_list = page.get_images(full=True)
@@ -98,21 +89,45 @@ def extract_images_from_pdf(
                 w, h = base.get("width", 0), base.get("height", 0)
                 if w < min_width or h < min_height:
                     continue
-                img_bytes = base["image"]
-                ext = base.get("ext", "png")
-                save_path = None
-                if out_dir:
-                    save_path = out_dir / f"{stem}_p{page_num + 1}_i{img_index}.{ext}"
-                    save_path.write_bytes(img_bytes)
-                    save_path = str(save_path)
-                results.append({
-                    "image": img_bytes,
+                yield {
+                    "image": base["image"],
+                    "ext": base.get("ext", "png"),
+                    "width": w,
+                    "height": h,
                     "page": page_num + 1,
                     "index": img_index,
-                    "path": save_path,
                     "source_paper": stem,
-                })
-    finally:
-        doc.close()
+                }
+
 
+def extract_images_from_pdf(
+    pdf_path: str | Path,
+    output_dir: Optional[str | Path] = None,
+    min_width: int = 100,
+    min_height: int = 100,
+) -> list[dict]:
+    """
+    Extract embedded images from PDF. Optionally save to output_dir.
+    Returns list of {"image": bytes | None, "page": int, "index": int, "path": str | None}.
+    When an image is saved to disk its bytes are not kept ("image" is None).
+    """
+    out_dir = Path(output_dir) if output_dir else None
+    if out_dir:
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    for fig in iter_images_from_pdf(pdf_path, min_width=min_width, min_height=min_height):
+        img_bytes = fig["image"]
+        save_path = None
+        if out_dir:
+            save_path = out_dir / f"{fig['source_paper']}_p{fig['page']}_i{fig['index']}.{fig['ext']}"
+            save_path.write_bytes(img_bytes)
+            save_path = str(save_path)
+        results.append({
+            "image": None if save_path else img_bytes,
+            "page": fig["page"],
+            "index": fig["index"],
+            "path": save_path,
+            "source_paper": fig["source_paper"],
+        })
     return results
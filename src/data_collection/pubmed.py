@@ -53,7 +53,7 @@ def _pmids_to_pmc_ids(pmids: list[str]) -> dict[str, str]:
 
 
 def fetch_pubmed_summaries(pmids: list[str]) -> list[dict]:
-    """Fetch title, abstract, and PMC ID for each PMID."""
+    """Fetch title, abstract, publication year, and PMC ID for each PMID."""
     if not pmids:
         return []
     handle = Entrez.efetch(db="pubmed", id=pmids, rettype="abstract", retmode="xml")
@@ -82,11 +82,14 @@ def fetch_pubmed_summaries(pmids: list[str]) -> list[dict]:
             else:
                 abstract = ""
             pmc_id = pmc_map.get(pmid)
+            pub_date = med.get("Journal", {}).get("JournalIssue", {}).get("PubDate", {})
+            year = str(pub_date.get("Year") or pub_date.get("MedlineDate", ""))[:4]
             out.append({
                 "pmid": pmid,
                 "pmc_id": pmc_id,
                 "title": title,
                 "abstract": abstract,
+                "year": int(year) if year.isdigit() else None,
             })
         except (KeyError, TypeError):
             continue
@@ -104,7 +107,7 @@ def pmc_id_to_pdf_url(pmc_id: str) -> Optional[str]:
 def fetch_pmc_pdf_links(pmids: list[str]) -> list[dict]:
     """
     For each PMID, get summary; then for those with PMC ID, build PDF link.
-    Returns list of {pmid, pmc_id, title, abstract, pdf_url}.
+    Returns list of {pmid, pmc_id, title, abstract, year, pdf_url}.
     """
     summaries = fetch_pubmed_summaries(pmids)
     results = []
@@ -1,10 +1,11 @@
-from .text_embeddings import load_text_model, embed_texts, embed_query_text
+from .text_embeddings import load_text_model, embed_texts, embed_query_text, chunk_text
 from .image_embeddings import load_image_model, embed_image, embed_query_image
 
 __all__ = [
     "load_text_model",
     "embed_texts",
     "embed_query_text",
+    "chunk_text",
     "load_image_model",
     "embed_image",
     "embed_query_image",
@@ -1,5 +1,6 @@
 """Image embedding pipeline using CLIP."""
 import io
+import threading
 from pathlib import Path
 from typing import Union
 
@@ -11,14 +12,17 @@ from src.config import IMAGE_EMBEDDING_MODEL
 
 _model: CLIPModel | None = None
 _processor: CLIPProcessor | None = None
+_model_lock = threading.Lock()
 
 
 def load_image_model(model_name: str = IMAGE_EMBEDDING_MODEL) -> tuple[CLIPModel, CLIPProcessor]:
     """Load and cache CLIP model and processor."""
     global _model, _processor
     if _model is None:
-        _model = CLIPModel.from_pretrained(model_name)
-        _processor = CLIPProcessor.from_pretrained(model_name)
+        with _model_lock:
+            if _model is None:
+                _processor = CLIPProcessor.from_pretrained(model_name)
+                _model = CLIPModel.from_pretrained(model_name)
     return _model, _processor  # type: ignore
 
 
@@ -1,33 +1,76 @@
 """Text embedding pipeline using SPECTER (scientific paper embeddings)."""
+import threading
 from pathlib import Path
 from typing import Union
 
 from sentence_transformers import SentenceTransformer
 
-from src.config import PROJECT_ROOT, TEXT_EMBEDDING_MODEL
+from src.config import (
+    EMBEDDING_BATCH_SIZE,
+    PASSAGE_MAX_TOKENS,
+    PASSAGE_OVERLAP_TOKENS,
+    PROJECT_ROOT,
+    TEXT_EMBEDDING_MODEL,
+)
 
 _model: SentenceTransformer | None = None
+_model_lock = threading.Lock()
 
 
 def load_text_model(model_name: str = TEXT_EMBEDDING_MODEL) -> SentenceTransformer:
     """Load and cache the text embedding model."""
     global _model
     if _model is None:
-        _model = SentenceTransformer(model_name)
+        # Service threads may all hit the first query at once; load only once
+        with _model_lock:
+            if _model is None:
+                _model = SentenceTransformer(model_name)
     return _model
 
 
 def embed_texts(
     texts: list[str],
     model: SentenceTransformer | None = None,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
 ) -> list[list[float]]:
     """Embed a list of texts. Returns list of embedding vectors."""
     if model is None:
         model = load_text_model()
-    embeddings = model.encode(texts, convert_to_numpy=True)
+    embeddings = model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
     return [e.tolist() for e in embeddings]
 
 
+def chunk_text(
+    text: str,
+    model: SentenceTransformer | None = None,
+    max_tokens: int = PASSAGE_MAX_TOKENS,
+    overlap: int = PASSAGE_OVERLAP_TOKENS,
+) -> list[str]:
+    """
+    Split text into overlapping passages of at most `max_tokens` model tokens,
+    so no passage is silently truncated by the encoder.
+    """
+    if model is None:
+        model = load_text_model()
+    text = text.strip()
+    if not text:
+        return []
+    # Leave room for the special tokens the encoder adds
+    max_tokens = min(max_tokens, model.max_seq_length - 2)
+    step = max(1, max_tokens - min(overlap, max_tokens // 2))
+    enc = model.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+    offsets = enc["offset_mapping"]
+    if len(offsets) <= max_tokens:
+        return [text]
+    chunks = []
+    for start in range(0, len(offsets), step):
+        window = offsets[start : start + max_tokens]
+        chunks.append(text[window[0][0] : window[-1][1]].strip())
+        if start + max_tokens >= len(offsets):
+            break
+    return chunks
+
+
 def embed_query_text(
     query: str,
     model: SentenceTransformer | None = None,
@@ -0,0 +1,20 @@
+from .pipeline import (
+    figure_entry,
+    index_figures,
+    index_papers,
+    index_passages,
+    load_paper_metadata,
+    paper_texts,
+)
+from .watcher import PaperWatcher, index_pdfs
+
+__all__ = [
+    "figure_entry",
+    "index_figures",
+    "index_papers",
+    "index_passages",
+    "load_paper_metadata",
+    "paper_texts",
+    "PaperWatcher",
+    "index_pdfs",
+]
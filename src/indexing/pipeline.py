@@ -0,0 +1,131 @@
+"""
+Extract, embed and upsert papers, passages and figures into the store. Shared
+by the full build (`scripts.build_index`) and the incremental watcher.
+"""
+import json
+from collections import defaultdict
+from pathlib import Path
+
+from src.config import PAPERS_DIR
+from src.data_collection.pdf_extract import extract_abstract_and_methods
+from src.embeddings import chunk_text, embed_image, embed_texts, load_image_model, load_text_model
+from src.retrieval import add_images_to_store, add_papers_to_store, add_passages_to_store
+from src.retrieval.store import delete_stale_figures
+
+
+def load_paper_metadata(stem: str) -> dict:
+    """Metadata for a paper: its source id plus anything saved by collect_papers."""
+    meta = {"source": stem}
+    meta_path = PAPERS_DIR / f"{stem}_meta.json"
+    if meta_path.exists():
+        saved = json.loads(meta_path.read_text(encoding="utf-8"))
+        # Chroma metadata values must be scalars; drop missing fields
+        meta.update({k: v for k, v in saved.items() if isinstance(v, (str, int, float, bool))})
+    return meta
+
+
+def paper_texts(pdf_path: Path) -> tuple[str, str]:
+    """
+    (paper-level text, passage text) for a PDF. The paper-level text is the saved
+    abstract if collect_papers wrote one, else abstract + methods; passages are
+    always cut from abstract + methods so long methods sections are covered.
+    If the PDF can't be parsed, passages fall back to the saved abstract.
+    """
+    try:
+        extracted = extract_abstract_and_methods(pdf_path)
+        full = (extracted.get("abstract") or "") + "\n" + (extracted.get("methods") or "")
+    except Exception as e:
+        # One corrupt PDF shouldn't abort a whole build
+        print(f"Could not extract text from {pdf_path.name}: {e}")
+        full = ""
+    abstract_file = PAPERS_DIR / f"{pdf_path.stem}_abstract.txt"
+    if abstract_file.exists():
+        abstract = abstract_file.read_text(encoding="utf-8")
+        return abstract, full if full.strip() else abstract
+    return full, full
+
+
+def figure_entry(record: dict) -> dict:
+    """Index entry for a figure store record (id is per occurrence; blobs may be shared)."""
+    return {
+        "id": f"{record['source_paper']}/p{record['page']}_i{record['index']}",
+        "path": record["path"],
+        "thumb": record.get("thumb"),
+        "source_paper": record["source_paper"],
+        "page": record["page"],
+    }
+
+
+def index_papers(paper_ids: list[str], paper_texts: list[str], metadatas: list[dict], shard: str | None = None):
+    print(f"Embedding {len(paper_ids)} papers...")
+    model = load_text_model()
+    embeddings = embed_texts(paper_texts, model=model)
+    add_papers_to_store(paper_ids, paper_texts, embeddings, metadatas, shard=shard)
+    print("Text index done.")
+
+
+def index_passages(
+    paper_ids: list[str],
+    full_texts: list[str],
+    metadatas: list[dict],
+    shard: str | None = None,
+    group_size: int = 1024,
+):
+    """Chunk each paper into token-bounded, overlapping passages and embed them in batches."""
+    model = load_text_model()
+    p_ids, p_texts, p_metas = [], [], []
+    for pid, text, meta in zip(paper_ids, full_texts, metadatas):
+        chunks = chunk_text(text, model=model)
+        for i, chunk in enumerate(chunks):
+            p_ids.append(f"{pid}#c{i}")
+            p_texts.append(chunk)
+            p_metas.append({**meta, "chunk": i, "n_chunks": len(chunks)})
+    print(f"Embedding {len(p_ids)} passages from {len(paper_ids)} papers...")
+    for start in range(0, len(p_ids), group_size):
+        end = start + group_size
+        embeddings = embed_texts(p_texts[start:end], model=model)
+        add_passages_to_store(p_ids[start:end], p_texts[start:end], embeddings, p_metas[start:end], shard=shard)
+    print("Passage index done.")
+
+
+def index_figures(
+    figures: list[dict],
+    paper_meta: dict[str, dict],
+    shard: str | None = None,
+    replace_papers: list[str] | None = None,
+):
+    """
+    Embed and upsert figures (shared blobs are embedded once). Afterwards, figures
+    indexed earlier for `replace_papers` (default: every paper in `figures`) that
+    aren't in `figures` any more are removed.
+    """
+    if figures:
+        load_image_model()
+    img_ids = []
+    img_embeddings = []
+    img_metadatas = []
+    by_path: dict[str, list[float]] = {}
+    for fig in figures:
+        img_path, source_paper = fig["path"], fig["source_paper"]
+        try:
+            if img_path not in by_path:
+                by_path[img_path] = embed_image(img_path)
+            img_ids.append(fig["id"])
+            img_embeddings.append(by_path[img_path])
+            meta = {k: v for k, v in fig.items() if k != "id" and v is not None}
+            if "year" in paper_meta.get(source_paper, {}):
+                meta["year"] = paper_meta[source_paper]["year"]
+            img_metadatas.append(meta)
+        except Exception as e:
+            print(f"Skip {img_path}: {e}")
+    if img_ids:
+        print(f"Embedding {len(img_ids)} figures...")
+        add_images_to_store(img_ids, img_embeddings, img_metadatas, shard=shard)
+        print("Image index done.")
+    elif replace_papers is None:
+        print("No figures found in the figure store or under data/figures/.")
+    keep: dict[str, list[str]] = defaultdict(list)
+    for fig in figures:
+        keep[fig["source_paper"]].append(fig["id"])
+    for paper in keep if replace_papers is None else replace_papers:
+        delete_stale_figures(paper, keep.get(paper, []), paper_meta.get(paper), shard=shard)
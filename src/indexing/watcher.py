@@ -0,0 +1,212 @@
+"""
+Watch PAPERS_DIR and index new or changed PDFs (text + figures) as they arrive.
+
+Polls the directory, waits until a file has been unchanged for the debounce
+window (so half-copied PDFs and bursts of arrivals are handled together), then
+hands ready files to a background worker that extracts, embeds and upserts them.
+Chroma searches in one process don't see vectors another process upserts, so
+the query service runs this watcher in its own process (SERVICE_WATCH_PAPERS=1).
+"""
+import json
+import queue
+import threading
+import time
+from pathlib import Path
+
+from src.config import DATA_DIR, PAPERS_DIR, WATCH_DEBOUNCE_SECONDS, WATCH_POLL_INTERVAL
+from src.data_collection.figure_store import store_figures_from_pdf
+from src.embeddings import embed_texts, load_text_model
+from src.indexing.pipeline import figure_entry, index_figures, index_passages, load_paper_metadata, paper_texts
+from src.retrieval import add_papers_to_store, get_or_create_collections
+from src.retrieval.query import find_unsearchable
+
+STATE_PATH = DATA_DIR / "watch_state.json"
+
+Signature = tuple[float, int]
+
+
+def scan(papers_dir: Path) -> dict[str, Signature]:
+    """(mtime, size) for every PDF in the directory."""
+    found = {}
+    for pdf_path in papers_dir.glob("*.pdf"):
+        try:
+            st = pdf_path.stat()
+        except FileNotFoundError:
+            continue
+        found[str(pdf_path)] = (st.st_mtime, st.st_size)
+    return found
+
+
+def index_pdfs(pdf_paths: list[Path]) -> list[str]:
+    """
+    Extract, embed and upsert a batch of PDFs and their figures. Returns the ids
+    of papers that were upserted but can't be found by searches from this process.
+    """
+    ids, texts, full_texts, metas = [], [], [], []
+    figures: list[dict] = []
+    paper_meta = {}
+    for pdf_path in pdf_paths:
+        stem = pdf_path.stem
+        paper_meta[stem] = load_paper_metadata(stem)
+        text, full = paper_texts(pdf_path)
+        if text.strip():
+            ids.append(stem)
+            texts.append(text)
+            full_texts.append(full)
+            metas.append(paper_meta[stem])
+        for rec in store_figures_from_pdf(pdf_path):
+            if Path(rec["path"]).suffix.lower() in (".png", ".jpg", ".jpeg"):
+                figures.append(figure_entry(rec))
+    unsearchable: list[str] = []
+    if ids:
+        embeddings = embed_texts(texts, model=load_text_model())
+        add_papers_to_store(ids, texts, embeddings, metas)
+        index_passages(ids, full_texts, metas)
+        unsearchable = find_unsearchable(ids, embeddings)
+    # Re-extracted papers may have fewer figures than before; drop the old ones
+    index_figures(figures, paper_meta, replace_papers=[p.stem for p in pdf_paths])
+    return unsearchable
+
+
+class PaperWatcher:
+    """Polling watcher with per-file debounce and a background indexing queue."""
+
+    def __init__(
+        self,
+        papers_dir: Path = PAPERS_DIR,
+        poll_interval: float = WATCH_POLL_INTERVAL,
+        debounce: float = WATCH_DEBOUNCE_SECONDS,
+        batch_size: int = 16,
+        state_path: Path = STATE_PATH,
+    ):
+        self.papers_dir = papers_dir
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.batch_size = batch_size
+        self.state_path = state_path
+        self.indexed: dict[str, Signature] = self._load_state()
+        self._pending: dict[str, tuple[Signature, float]] = {}
+        self._queued: set[str] = set()
+        self._queue: queue.Queue[tuple[str, Signature]] = queue.Queue()
+        self.failed: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def _load_state(self) -> dict[str, Signature]:
+        if not self.state_path.exists():
+            return {}
+        return {k: tuple(v) for k, v in json.loads(self.state_path.read_text(encoding="utf-8")).items()}
+
+    def _save_state(self) -> None:
+        with self._lock:
+            data = dict(self.indexed)
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        tmp.replace(self.state_path)
+
+    def poll(self) -> None:
+        """One scan: start/restart debounce timers and enqueue files that have settled."""
+        now = time.monotonic()
+        current = scan(self.papers_dir)
+        with self._lock:
+            for path, sig in current.items():
+                if self.indexed.get(path) == sig or path in self._queued:
+                    continue
+                seen = self._pending.get(path)
+                if seen is None or seen[0] != sig:
+                    self._pending[path] = (sig, now)
+            for path in list(self._pending):
+                if path not in current:
+                    del self._pending[path]
+                    continue
+                sig, since = self._pending[path]
+                if now - since >= self.debounce:
+                    del self._pending[path]
+                    self._queued.add(path)
+                    self._queue.put((path, sig))
+
+    def _worker(self) -> None:
+        while not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._index_batch(batch)
+
+    def _index_batch(self, batch: list[tuple[str, Signature]]) -> None:
+        paths = [Path(p) for p, _ in batch]
+        start = time.perf_counter()
+        failed: dict[str, str] = {}
+        unsearchable: list[str] = []
+        try:
+            unsearchable = index_pdfs(paths)
+        except Exception:
+            # Find the bad file(s): retry one at a time so good PDFs in the batch still get indexed
+            for path in paths:
+                try:
+                    unsearchable += index_pdfs([path])
+                except Exception as e:
+                    failed[str(path)] = f"{type(e).__name__}: {e}"
+        done = [p.stem for p in paths if str(p) not in failed]
+        if done:
+            print(f"Indexed {len(done)} PDF(s) in {time.perf_counter() - start:.1f}s: {', '.join(done)}")
+        for path, error in failed.items():
+            print(f"Failed to index {Path(path).name}: {error}")
+        if unsearchable:
+            print(f"Warning: indexed but not found by search from this process: {', '.join(unsearchable)}")
+        with self._lock:
+            for path, sig in batch:
+                # Failed files are recorded too, so they aren't retried until they change
+                self.indexed[path] = sig
+                self._queued.discard(path)
+                if path in failed:
+                    self.failed[path] = failed[path]
+                else:
+                    self.failed.pop(path, None)
+        self._save_state()
+
+    def _poll_loop(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Watcher poll failed: {e}")
+
+    def start(self) -> None:
+        """Run the poll loop and indexing worker on daemon threads (e.g. inside the serving process)."""
+        self.papers_dir.mkdir(parents=True, exist_ok=True)
+        get_or_create_collections()
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._worker, name="watch-indexer", daemon=True),
+            threading.Thread(target=self._poll_loop, name="watch-poll", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+        print(f"Watching {self.papers_dir} (poll {self.poll_interval}s, debounce {self.debounce}s).")
+
+    def stop(self) -> None:
+        """Stop polling and wait for the current batch. Queued files are not in the saved state, so the next run picks them up."""
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def run(self) -> None:
+        load_text_model()  # load once up front so the first batch isn't slowed by it
+        self.start()
+        print("Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("Stopping after the current batch...")
+        finally:
+            self.stop()
@@ -1,9 +1,13 @@
-from .store import get_or_create_collections, add_papers_to_store, add_images_to_store
+from .store import get_or_create_collections, add_papers_to_store, add_passages_to_store, add_images_to_store
+from .sharding import list_shards, mount_shard
 from .query import process_query
 
 __all__ = [
     "get_or_create_collections",
     "add_papers_to_store",
+    "add_passages_to_store",
     "add_images_to_store",
+    "list_shards",
+    "mount_shard",
     "process_query",
 ]
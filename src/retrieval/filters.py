@@ -0,0 +1,80 @@
+"""Evaluate Chroma-style `where` metadata filters outside Chroma (lexical index, snapshots)."""
+from typing import Any, Optional
+
+_OPS = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+    "$in": lambda a, b: a in b,
+    "$nin": lambda a, b: a not in b,
+}
+
+
+def matches(metadata: Optional[dict[str, Any]], where: Optional[dict[str, Any]]) -> bool:
+    """
+    True if metadata satisfies the filter. Supports the Chroma subset used here:
+    {"field": value}, {"field": {"$op": value}}, "$and" and "$or".
+    """
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(matches(metadata, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(matches(metadata, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = metadata.get(key)
+            for op, operand in cond.items():
+                if op not in _OPS:
+                    raise ValueError(f"unsupported filter operator {op}")
+                try:
+                    if not _OPS[op](value, operand):
+                        return False
+                except TypeError:
+                    return False
+        elif metadata.get(key) != cond:
+            return False
+    return True
+
+
+def equality_terms(where: Optional[dict[str, Any]]) -> list[tuple[str, list[Any]]]:
+    """
+    (field, allowed values) constraints that every match must satisfy, from
+    top-level / $and equality and $in clauses. Used to prune with a field index.
+    """
+    if not where:
+        return []
+    terms = []
+    for key, cond in where.items():
+        if key == "$and":
+            for c in cond:
+                terms.extend(equality_terms(c))
+        elif key == "$or":
+            continue
+        elif isinstance(cond, dict):
+            if "$eq" in cond:
+                terms.append((key, [cond["$eq"]]))
+            elif "$in" in cond:
+                terms.append((key, list(cond["$in"])))
+        else:
+            terms.append((key, [cond]))
+    return terms
+
+
+def rename_field(where: Optional[dict[str, Any]], old: str, new: str) -> Optional[dict[str, Any]]:
+    """The same filter with conditions on metadata field `old` applied to `new` instead."""
+    if not where:
+        return where
+    renamed = {}
+    for key, cond in where.items():
+        if key in ("$and", "$or"):
+            renamed[key] = [rename_field(c, old, new) for c in cond]
+        else:
+            renamed[new if key == old else key] = cond
+    return renamed
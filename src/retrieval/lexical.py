@@ -0,0 +1,270 @@
+"""Local BM25 inverted index over indexed texts, for exact-term hits dense search misses.
+
+One index per collection per Chroma directory (the single store or each shard),
+stored in SQLite next to the collection it covers and updated by the same
+`add_*_to_store` calls. A write only touches the changed documents' rows and
+stamps them with a sequence number; readers keep the postings in memory and
+catch up on rows newer than the last one they applied, so writes from other
+processes show up without reloading the whole index. Only term counts and
+metadata are stored; texts stay in Chroma. Metadata filters are applied to
+candidate documents before any scoring: equality/$in clauses prune through a
+field index, the rest are checked per candidate.
+"""
+import heapq
+import json
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from src.retrieval.filters import equality_terms, matches
+
+# A NULL `terms` marks a deleted document, so readers catching up see the delete
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id TEXT PRIMARY KEY,
+    terms TEXT,
+    metadata TEXT,
+    seq INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS docs_seq ON docs (seq);
+"""
+# Seconds a writer waits for another process's write transaction on the same index
+WRITE_TIMEOUT = 60.0
+
+# Keeps drug names, gene symbols and band names intact (IL-6, 5-HT2A, beta-blocker, α-synuclein)
+_TOKEN_RE = re.compile(r"\w(?:[\w\-]*\w)?")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from in into is it of on or that the their this to was were with".split()
+)
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased terms; hyphenated terms are indexed whole and by their parts."""
+    terms = []
+    for tok in _TOKEN_RE.findall(text.lower()):
+        if tok in _STOPWORDS:
+            continue
+        terms.append(tok)
+        if "-" in tok:
+            terms.extend(p for p in tok.split("-") if p and p not in _STOPWORDS)
+    return terms
+
+
+class LexicalIndex:
+    """BM25 over documents keyed by the same ids as the vector collection."""
+
+    def __init__(self, path: Path, readonly: bool = False):
+        self.path = path
+        self.readonly = readonly
+        self.postings: dict[str, dict[str, int]] = defaultdict(dict)
+        self.doc_terms: dict[str, dict[str, int]] = {}
+        self.doc_len: dict[str, int] = {}
+        self.metadatas: dict[str, dict[str, Any]] = {}
+        self.field_index: dict[str, dict[Any, set[str]]] = defaultdict(lambda: defaultdict(set))
+        self.total_len = 0
+        self.seq = 0  # newest change applied to the in-memory copy
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        """This thread's connection to the index file, creating the table on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.readonly:
+                # Snapshot copies never change once published
+                conn = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro&immutable=1", uri=True)
+            else:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(self.path, timeout=WRITE_TIMEOUT, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def refresh(self, conn: Optional[sqlite3.Connection] = None) -> None:
+        """Apply documents written (by any process) since the last refresh; the first call loads everything."""
+        if self.readonly and not self.path.exists():
+            return
+        with self._refresh_lock:
+            conn = conn or self._connect()
+            rows = [
+                (doc_id, json.loads(terms) if terms is not None else None, json.loads(meta) if meta else {}, seq)
+                for doc_id, terms, meta, seq in conn.execute(
+                    "SELECT id, terms, metadata, seq FROM docs WHERE seq > ? ORDER BY seq", (self.seq,)
+                )
+            ]
+            if not rows:
+                return
+            # Rows are fetched and parsed first, so searches only wait for the apply
+            with self._lock:
+                for doc_id, terms, meta, _ in rows:
+                    self._remove(doc_id)
+                    if terms is not None:
+                        self._add(doc_id, terms, meta)
+                self.seq = rows[-1][3]
+
+    @contextmanager
+    def edit(self) -> Iterator["LexicalWriter"]:
+        """
+        A write transaction, committed when the block exits and rolled back if
+        it raises. Writers from all processes are serialized by SQLite.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # No other writer can commit now; catch up so deletes see every stored document
+            self.refresh(conn)
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM docs").fetchone()[0]
+            yield LexicalWriter(self, conn, seq)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        self.refresh()
+
+    def _add(self, doc_id: str, terms: dict[str, int], meta: dict[str, Any]) -> None:
+        for term, tf in terms.items():
+            self.postings[term][doc_id] = tf
+        self.doc_terms[doc_id] = terms
+        self.doc_len[doc_id] = sum(terms.values())
+        self.total_len += self.doc_len[doc_id]
+        self.metadatas[doc_id] = meta
+        for field, value in meta.items():
+            if isinstance(value, (str, int, float, bool)):
+                self.field_index[field][value].add(doc_id)
+
+    def _remove(self, doc_id: str) -> None:
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self.postings[term]
+        self.total_len -= self.doc_len.pop(doc_id, 0)
+        for field, value in self.metadatas.pop(doc_id, {}).items():
+            if isinstance(value, (str, int, float, bool)):
+                self.field_index[field][value].discard(doc_id)
+
+    def matching(self, where: dict[str, Any]) -> list[str]:
+        """Ids of the loaded documents matching `where`."""
+        with self._lock:
+            candidates = self._allowed_docs(where)
+            candidates = self.metadatas if candidates is None else candidates
+            return [d for d in candidates if matches(self.metadatas.get(d), where)]
+
+    def _allowed_docs(self, where: Optional[dict[str, Any]]) -> Optional[set[str]]:
+        """Docs admitted by the filter's equality clauses via the field index (None = no pruning)."""
+        allowed: Optional[set[str]] = None
+        for field, values in equality_terms(where):
+            docs = set().union(*(self.field_index.get(field, {}).get(v, set()) for v in values))
+            allowed = docs if allowed is None else allowed & docs
+        return allowed
+
+    def search(self, query: str, top_k: int, where: Optional[dict[str, Any]] = None) -> list[dict[str, Any]]:
+        """Top-k BM25 rows {"id", "metadata", "bm25"} among documents matching `where`."""
+        with self._lock:
+            n_docs = len(self.doc_len)
+            if not n_docs:
+                return []
+            avg_len = self.total_len / n_docs
+            allowed = self._allowed_docs(where)
+            admitted: dict[str, bool] = {}
+            scores: dict[str, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                candidates = docs.keys() if allowed is None else (allowed & docs.keys())
+                for doc_id in candidates:
+                    # Filter before scoring; each doc is checked once per query
+                    ok = admitted.get(doc_id)
+                    if ok is None:
+                        ok = admitted[doc_id] = matches(self.metadatas.get(doc_id), where)
+                    if not ok:
+                        continue
+                    tf = docs[doc_id]
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[doc_id] / avg_len)
+                    scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+            top = heapq.nlargest(top_k, scores.items(), key=lambda kv: kv[1])
+            return [{"id": d, "metadata": self.metadatas[d], "bm25": s} for d, s in top]
+
+
+class LexicalWriter:
+    """Changes to one index, written inside a single transaction and applied to memory on commit."""
+
+    def __init__(self, index: LexicalIndex, conn: sqlite3.Connection, seq: int):
+        self.index = index
+        self.conn = conn
+        self.seq = seq
+        self.pending: dict[str, Optional[dict[str, Any]]] = {}  # metadata written so far; None once deleted
+
+    def upsert(self, ids: list[str], texts: list[str], metadatas: list[dict[str, Any]]) -> None:
+        self.upsert_terms(ids, [dict(Counter(tokenize(text or ""))) for text in texts], metadatas)
+
+    def upsert_terms(self, ids: list[str], terms: list[dict[str, int]], metadatas: list[dict[str, Any]]) -> None:
+        """Upsert already-counted documents (e.g. copied from another index)."""
+        rows = []
+        for doc_id, counts, meta in zip(ids, terms, metadatas):
+            self.pending[doc_id] = meta or {}
+            rows.append((doc_id, json.dumps(counts), json.dumps(meta or {}), self.seq))
+        self.conn.executemany("INSERT OR REPLACE INTO docs (id, terms, metadata, seq) VALUES (?, ?, ?, ?)", rows)
+
+    def delete_where(self, where: dict[str, Any]) -> None:
+        """Delete stored documents, and ones upserted earlier in this transaction, matching `where`."""
+        doomed = {d for d in self.index.matching(where) if d not in self.pending}
+        doomed.update(d for d, meta in self.pending.items() if meta is not None and matches(meta, where))
+        for doc_id in doomed:
+            self.pending[doc_id] = None
+        self.conn.executemany(
+            "UPDATE docs SET terms = NULL, metadata = NULL, seq = ? WHERE id = ?", [(self.seq, d) for d in doomed]
+        )
+
+
+_indexes: dict[str, LexicalIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def lexical_index_path(directory: str | Path, collection_name: str) -> Path:
+    """Where a collection's BM25 index lives: inside the Chroma directory (or snapshot) it covers."""
+    return Path(directory) / f"{collection_name}.bm25.sqlite3"
+
+
+def get_lexical_index(directory: str | Path, collection_name: str, readonly: bool = False) -> LexicalIndex:
+    """Cached index for a collection, caught up with writes made since it was last used."""
+    path = lexical_index_path(directory, collection_name)
+    with _indexes_lock:
+        index = _indexes.get(str(path))
+        if index is None:
+            index = _indexes[str(path)] = LexicalIndex(path, readonly)
+    # Outside the global lock: loading one index doesn't hold up queries on the others
+    index.refresh()
+    return index
+
+
+def edit_lexical_index(directory: str | Path, collection_name: str):
+    """Write transaction on a collection's index (see `LexicalIndex.edit`)."""
+    return get_lexical_index(directory, collection_name).edit()
+
+
+def write_lexical_file(path: Path, ids: list[str], texts: list[str], metadatas: list[dict[str, Any]]) -> None:
+    """A standalone index file holding exactly these documents, e.g. to ship with a snapshot."""
+    index = LexicalIndex(path)
+    with index.edit() as lexical:
+        lexical.upsert(ids, texts, metadatas)
+    conn = index._connect()
+    # Fold the write-ahead log back in so the file stands alone
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.close()
@@ -1,12 +1,296 @@
 """Dual retrieval: text + image by query (text and/or image)."""
+import heapq
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Optional
 
 from PIL import Image
 
-from src.config import DEFAULT_TOP_K_IMAGES, DEFAULT_TOP_K_TEXT
+from src.config import (
+    DEFAULT_TOP_K_IMAGES,
+    DEFAULT_TOP_K_TEXT,
+    PASSAGE_AGGREGATION,
+    PASSAGE_OVERFETCH,
+    PASSAGES_PER_PAPER,
+    RERANK_CANDIDATES,
+    RERANK_ENABLED,
+    RERANKER,
+    RRF_K,
+    SHARD_QUERY_WORKERS,
+    USE_HYBRID,
+    USE_PASSAGES,
+)
 from src.embeddings import embed_query_image, embed_query_text
-from src.retrieval.store import get_or_create_collections
+from src.retrieval.filters import rename_field
+from src.retrieval.rerank import rerank
+from src.retrieval.store import (
+    PASSAGE_COLLECTION_NAME,
+    TEXT_COLLECTION_NAME,
+    iter_collections,
+    iter_lexical_indexes,
+    iter_passage_collections,
+    reopen_collection,
+)
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=SHARD_QUERY_WORKERS, thread_name_prefix="shard-query")
+    return _executor
+
+
+def _on_live(coll, fn):
+    """fn(coll), retried once on a fresh handle if the cached one was replaced by a migration."""
+    try:
+        return fn(coll)
+    except Exception as exc:
+        try:
+            fresh = reopen_collection(coll)
+        except LookupError:
+            raise exc from None
+        return fn(fresh)
+
+
+def _query_one(
+    coll,
+    embedding: list[float],
+    n_results: int,
+    include: list[str],
+    where: Optional[dict[str, Any]] = None,
+) -> list[dict[str, Any]]:
+    """Query a single collection (filter applied inside the search) and flatten Chroma's nested lists into rows."""
+    return _on_live(coll, lambda c: _query_rows(c, embedding, n_results, include, where))
+
+
+def _query_rows(coll, embedding, n_results, include, where) -> list[dict[str, Any]]:
+    count = coll.count()
+    if count == 0:
+        return []
+    kwargs = {"where": where} if where else {}
+    res = coll.query(
+        query_embeddings=[embedding],
+        n_results=min(n_results, count),
+        include=include,
+        **kwargs,
+    )
+    # Chroma returns dict with lists: ids[0], documents[0], metadatas[0]
+    if not res["ids"] or not res["ids"][0]:
+        return []
+    rows = []
+    for i, id_ in enumerate(res["ids"][0]):
+        row = {"id": id_}
+        if "documents" in include:
+            row["text"] = res["documents"][0][i]
+        row["metadata"] = res["metadatas"][0][i]
+        row["distance"] = res["distances"][0][i]
+        if "embeddings" in include:
+            row["embedding"] = res["embeddings"][0][i]
+        rows.append(row)
+    return rows
+
+
+def _fan_out(
+    collections: list,
+    embedding: list[float],
+    n_results: int,
+    include: list[str],
+    where: Optional[dict[str, Any]] = None,
+) -> list[dict[str, Any]]:
+    """Query every shard in parallel and merge the per-shard top-k with a heap."""
+    if len(collections) == 1:
+        return _query_one(collections[0], embedding, n_results, include, where)
+    futures = [_get_executor().submit(_query_one, c, embedding, n_results, include, where) for c in collections]
+    hits = (row for f in futures for row in f.result())
+    return heapq.nsmallest(n_results, hits, key=lambda r: r["distance"])
+
+
+def _lexical_one(index, coll, query: str, n_results: int, where: Optional[dict[str, Any]]) -> list[dict[str, Any]]:
+    """BM25 hits from one directory's index; "_coll" remembers where to read their texts (see `_fill_texts`)."""
+    return [{**h, "_coll": coll} for h in index.search(query, n_results, where)]
+
+
+def _fill_texts(rows: list[dict[str, Any]], with_embeddings: bool = False) -> list[dict[str, Any]]:
+    """
+    Fetch texts (and stored embeddings, for cosine reranking) for BM25 rows from
+    their collections, one `get` per collection, so only rows that made it this
+    far are read. Rows the collection no longer has (deleted, or not written
+    yet) are dropped.
+    """
+    by_coll: dict[int, tuple[Any, list[str]]] = {}
+    for row in rows:
+        if "_coll" in row:
+            by_coll.setdefault(id(row["_coll"]), (row["_coll"], []))[1].append(row["id"])
+    include = ["documents", "embeddings"] if with_embeddings else ["documents"]
+    fetched: dict[tuple[int, str], dict[str, Any]] = {}
+    for key, (coll, ids) in by_coll.items():
+        res = _on_live(coll, lambda c: c.get(ids=ids, include=include))
+        for i, id_ in enumerate(res["ids"]):
+            fetched[(key, id_)] = {"text": res["documents"][i]}
+            if with_embeddings:
+                fetched[(key, id_)]["embedding"] = res["embeddings"][i]
+    filled = []
+    for row in rows:
+        if "_coll" not in row:
+            filled.append(row)
+            continue
+        extra = fetched.get((id(row["_coll"]), row["id"]))
+        if extra is not None:
+            filled.append({**{k: v for k, v in row.items() if k != "_coll"}, **extra})
+    return filled
+
+
+def _lexical_fan_out(
+    collection_name: str,
+    query: str,
+    n_results: int,
+    where: Optional[dict[str, Any]] = None,
+) -> list[dict[str, Any]]:
+    """BM25 search every shard's index in parallel and merge the per-shard top-k by score."""
+    pairs = iter_lexical_indexes(collection_name)
+    if len(pairs) == 1:
+        return _lexical_one(*pairs[0], query, n_results, where)
+    futures = [_get_executor().submit(_lexical_one, index, coll, query, n_results, where) for index, coll in pairs]
+    hits = (row for f in futures for row in f.result())
+    return heapq.nlargest(n_results, hits, key=lambda r: r["bm25"])
+
+
+def find_unsearchable(ids: list[str], embeddings: list[list[float]], k: int = 10) -> list[str]:
+    """
+    Papers among `ids` that this process can't find by their own embedding in
+    the top k, i.e. upserted but not (yet) visible to searches from here.
+    """
+    colls = [t for t, _ in iter_collections()]
+    missing = []
+    for id_, embedding in zip(ids, embeddings):
+        hits = _fan_out(colls, embedding, k, ["metadatas", "distances"])
+        if all(h["id"] != id_ for h in hits):
+            missing.append(id_)
+    return missing
+
+
+def aggregate_passages(
+    hits: list[dict[str, Any]],
+    top_k: int,
+    method: str = PASSAGE_AGGREGATION,
+    passages_per_paper: int = PASSAGES_PER_PAPER,
+    with_embeddings: bool = False,
+) -> list[dict[str, Any]]:
+    """
+    Group passage hits by paper and rank papers by the max (or sum) of their
+    passage similarities (vector hits) or BM25 scores (lexical hits). Each
+    paper's "text" is only its best-matching passages, in document order, so
+    the LLM prompt carries just those; "top_passage_score" is the best one's score.
+    `with_embeddings` fetches stored embeddings for lexical hits (see `_fill_texts`).
+    """
+    by_paper: dict[str, list[dict[str, Any]]] = {}
+    for hit in hits:
+        by_paper.setdefault(hit["metadata"].get("source", hit["id"]), []).append(hit)
+    scored = []
+    for source, passages in by_paper.items():
+        sims = [_similarity(p) for p in passages]
+        score = sum(sims) if method == "sum" else max(sims)
+        scored.append((score, source, sorted(passages, key=_similarity, reverse=True)))
+    top = heapq.nlargest(top_k, scored, key=lambda t: t[0])
+    # Only the passages that end up in the results need their texts
+    chosen = _fill_texts([p for _, _, ranked in top for p in ranked[:passages_per_paper]], with_embeddings)
+    kept = {p["id"]: p for p in chosen}
+    papers = []
+    for score, source, ranked in top:
+        best = [kept[p["id"]] for p in ranked[:passages_per_paper] if p["id"] in kept]
+        if not best:
+            continue
+        best.sort(key=lambda p: p["metadata"].get("chunk", 0))
+        meta = {k: v for k, v in best[0]["metadata"].items() if k not in ("chunk", "n_chunks")}
+        paper = {
+            "id": source,
+            "text": "\n...\n".join(p["text"] for p in best),
+            "metadata": meta,
+            "score": score,
+            "top_passage_score": _similarity(ranked[0]),
+            "passages": [{"chunk": p["metadata"].get("chunk"), "text": p["text"]} for p in best],
+        }
+        if "distance" in ranked[0]:
+            paper["distance"] = ranked[0]["distance"]
+        lead = next(kept[p["id"]] for p in ranked if p["id"] in kept)
+        if "embedding" in lead:
+            paper["embedding"] = lead["embedding"]
+        papers.append(paper)
+    return papers
+
+
+def _passage_papers(
+    passage_colls: list,
+    embedding: list[float],
+    top_k: int,
+    include: list[str],
+    where: Optional[dict[str, Any]] = None,
+    max_rounds: int = 4,
+) -> list[dict[str, Any]]:
+    """
+    Papers ranked by their passage hits. Over-fetches passages, doubling a few
+    times if needed, until `top_k` distinct papers turn up or the matches run out.
+    """
+    n = top_k * PASSAGE_OVERFETCH
+    for _ in range(max_rounds):
+        hits = _fan_out(passage_colls, embedding, n, include, where)
+        papers = aggregate_passages(hits, top_k)
+        if len(papers) >= top_k or len(hits) < n:
+            break
+        n *= 2
+    return papers
+
+
+def _papers_with_passages(passage_colls: list, paper_ids: list[str]) -> set[str]:
+    """Which of `paper_ids` have passages indexed (one chunk-0 lookup per collection)."""
+    if not paper_ids:
+        return set()
+    where = {"$and": [{"source": {"$in": paper_ids}}, {"chunk": 0}]}
+    found = set()
+    for coll in passage_colls:
+        res = _on_live(coll, lambda c: c.get(where=where, include=["metadatas"]))
+        found.update(m.get("source") for m in res["metadatas"] or [])
+    return found
+
+
+def _merge_ranked(primary: list[dict[str, Any]], extra: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Insert paper-level `extra` rows into the passage-ranked `primary` list,
+    keeping `primary`'s own order. Papers are compared by their best single
+    passage, which is on the same scale as a paper-level hit whatever
+    PASSAGE_AGGREGATION sums or maxes into their rank score.
+    """
+    extra = sorted(extra, key=_similarity, reverse=True)
+    merged, j = [], 0
+    for row in primary:
+        while j < len(extra) and _similarity(extra[j]) > row["top_passage_score"]:
+            merged.append(extra[j])
+            j += 1
+        merged.append(row)
+    return merged + extra[j:]
+
+
+def _similarity(hit: dict[str, Any]) -> float:
+    return hit["bm25"] if "bm25" in hit else 1.0 / (1.0 + hit["distance"])
+
+
+def reciprocal_rank_fusion(ranked_lists: list[list[dict[str, Any]]], top_k: int, k: int = RRF_K) -> list[dict[str, Any]]:
+    """Fuse ranked result lists by summing 1 / (k + rank); rows from earlier lists win on id clashes."""
+    scores: dict[str, float] = defaultdict(float)
+    rows: dict[str, dict[str, Any]] = {}
+    for ranked in ranked_lists:
+        for rank, row in enumerate(ranked, start=1):
+            scores[row["id"]] += 1.0 / (k + rank)
+            rows.setdefault(row["id"], row)
+    top = heapq.nlargest(top_k, scores.items(), key=lambda kv: kv[1])
+    return [{**rows[id_], "rrf_score": score} for id_, score in top]
 
 
 def process_query(
@@ -14,57 +298,64 @@ def process_query(
     query_image: Optional[Image.Image] = None,
     top_k_text: int = DEFAULT_TOP_K_TEXT,
     top_k_images: int = DEFAULT_TOP_K_IMAGES,
+    use_passages: bool = USE_PASSAGES,
+    use_rerank: bool = RERANK_ENABLED,
+    use_hybrid: bool = USE_HYBRID,
+    where: Optional[dict[str, Any]] = None,
 ) -> dict[str, Any]:
     """
     Run text and/or image retrieval.
+    With `use_passages`, text search runs over the passage index and hits are
+    aggregated back to papers; papers indexed without passages (before the
+    passage index existed) are merged in from paper-level search by score. With
+    `use_hybrid`, BM25 results are fused with the vector results by reciprocal
+    rank fusion. With `use_rerank`,
+    RERANK_CANDIDATES text results are over-fetched and reranked to top_k_text
+    within the rerank latency budget. `where` is a Chroma metadata filter
+    (e.g. {"year": {"$gte": 2020}}) applied inside both lexical and vector search;
+    for image search, conditions on "source" apply to the figure's "source_paper".
     Returns {"text_results": [...], "image_results": [...]}.
     """
-    text_coll, image_coll = get_or_create_collections()
+    pairs = iter_collections()
     results: dict[str, Any] = {"text_results": [], "image_results": []}
+    if not pairs:
+        return results
 
     if query and query.strip():
         query_embedding = embed_query_text(query.strip())
-        text_results = text_coll.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k_text,
-            include=["documents", "metadatas", "distances"],
-        )
-        # Chroma returns dict with lists: ids[0], documents[0], metadatas[0]
-        if text_results["ids"] and text_results["ids"][0]:
-            results["text_results"] = [
-                {
-                    "id": id_,
-                    "text": doc,
-                    "metadata": meta,
-                    "distance": dist,
-                }
-                for id_, doc, meta, dist in zip(
-                    text_results["ids"][0],
-                    text_results["documents"][0],
-                    text_results["metadatas"][0],
-                    text_results["distances"][0],
-                )
+        include = ["documents", "metadatas", "distances"]
+        first_k = max(top_k_text, RERANK_CANDIDATES) if use_rerank else top_k_text
+        if use_rerank and RERANKER == "cosine":
+            include.append("embeddings")
+        ranked = [_fan_out([t for t, _ in pairs], query_embedding, first_k, include, where)]
+        if use_hybrid:
+            ranked.append(_lexical_fan_out(TEXT_COLLECTION_NAME, query, first_k, where))
+        passage_colls = iter_passage_collections() if use_passages else []
+        if any(_on_live(c, lambda c: c.count()) for c in passage_colls):
+            passage_ranked = [_passage_papers(passage_colls, query_embedding, first_k, include, where)]
+            if use_hybrid:
+                lexical_hits = _lexical_fan_out(PASSAGE_COLLECTION_NAME, query, first_k * PASSAGE_OVERFETCH, where)
+                passage_ranked.append(aggregate_passages(lexical_hits, first_k, with_embeddings="embeddings" in include))
+            # Papers with passages are ranked by them; the rest keep their paper-level hits
+            hit_ids = list({row["id"] for rows in ranked for row in rows})
+            chunked = _papers_with_passages(passage_colls, hit_ids)
+            ranked = [
+                _merge_ranked(by_passage, [row for row in by_paper if row["id"] not in chunked])
+                for by_passage, by_paper in zip(passage_ranked, ranked)
             ]
+        candidates = ranked[0] if len(ranked) == 1 else reciprocal_rank_fusion(ranked, first_k)
+        candidates = _fill_texts(candidates[:first_k], with_embeddings="embeddings" in include)
+        if use_rerank:
+            results["text_results"] = rerank(query.strip(), candidates, top_k_text, query_embedding=query_embedding)
+        else:
+            results["text_results"] = [{k: v for k, v in c.items() if k != "embedding"} for c in candidates]
 
     if query_image is not None:
         img_embedding = embed_query_image(query_image)
-        image_results = image_coll.query(
-            query_embeddings=[img_embedding],
-            n_results=top_k_images,
-            include=["metadatas", "distances"],
+        # Figures name their paper in "source_paper" rather than "source"
+        image_where = rename_field(where, "source", "source_paper")
+        results["image_results"] = _fan_out(
+            [i for _, i in pairs], img_embedding, top_k_images, ["metadatas", "distances"], image_where
         )
-        if image_results["ids"] and image_results["ids"][0]:
-            results["image_results"] = [
-                {
-                    "id": id_,
-                    "metadata": meta,
-                    "distance": dist,
-                }
-                for id_, meta, dist in zip(
-                    image_results["ids"][0],
-                    image_results["metadatas"][0],
-                    image_results["distances"][0],
-                )
-            ]
 
     return results
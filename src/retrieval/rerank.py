@@ -0,0 +1,113 @@
+"""Second-stage reranking of over-fetched text candidates under a latency budget."""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Any, Optional
+
+import numpy as np
+
+from src.config import RERANK_BUDGET_MS, RERANK_CACHE_SIZE, RERANK_MAX_QUEUED, RERANK_MODEL, RERANKER
+
+_cross_encoder = None
+_model_lock = threading.Lock()
+_cache: OrderedDict[tuple[str, str, str], float] = OrderedDict()
+_cache_lock = threading.Lock()
+# One worker: scoring is batched, and a slow batch makes later requests fall back instead of piling up
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+# Jobs allowed in the executor at once (the running one plus RERANK_MAX_QUEUED waiting)
+_slots = threading.BoundedSemaphore(1 + RERANK_MAX_QUEUED)
+
+
+def load_reranker(model_name: str = RERANK_MODEL):
+    """Load and cache the cross-encoder."""
+    global _cross_encoder
+    if _cross_encoder is None:
+        with _model_lock:
+            if _cross_encoder is None:
+                from sentence_transformers import CrossEncoder
+
+                _cross_encoder = CrossEncoder(model_name)
+    return _cross_encoder
+
+
+def _score(method: str, query: str, query_embedding: Optional[list[float]], candidates: list[dict]) -> list[float]:
+    """Score all candidates in one batched pass."""
+    if method == "cosine":
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q /= max(float(np.linalg.norm(q)), 1e-12)
+        # Candidates without a stored vector (callers that didn't fetch one) rank below the rest
+        return [
+            float(np.dot(c["embedding"], q) / max(float(np.linalg.norm(c["embedding"])), 1e-12))
+            if c.get("embedding") is not None else -2.0
+            for c in candidates
+        ]
+    model = load_reranker()
+    return model.predict([(query, c.get("text", "")) for c in candidates]).tolist()
+
+
+def _store(method: str, query: str, candidates: list[dict], scores: list[float]) -> None:
+    with _cache_lock:
+        for c, score in zip(candidates, scores):
+            _cache[(method, query, c["id"])] = score
+        while len(_cache) > RERANK_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _finish(future: Future, method: str, query: str, candidates: list[dict]) -> None:
+    """Free the job's slot and cache its scores if it ran to completion."""
+    _slots.release()
+    if not future.cancelled() and future.exception() is None:
+        _store(method, query, candidates, future.result())
+
+
+def _strip(row: dict[str, Any]) -> dict[str, Any]:
+    return {k: v for k, v in row.items() if k != "embedding"}
+
+
+def rerank(
+    query: str,
+    candidates: list[dict[str, Any]],
+    top_k: int,
+    query_embedding: Optional[list[float]] = None,
+    method: str = RERANKER,
+    budget_ms: float = RERANK_BUDGET_MS,
+) -> list[dict[str, Any]]:
+    """
+    Rescore first-stage candidates and return the top_k by rerank score.
+    Scores are cached per (query, doc). If uncached scoring doesn't finish within
+    `budget_ms`, the first-stage order is returned unchanged. A timed-out job is
+    cancelled if it hasn't started; one already running finishes and fills the
+    cache for the next identical query. When the scoring queue is full, the
+    request falls back right away instead of queueing behind it, and so does
+    one whose scoring raises.
+    """
+    start = time.perf_counter()
+    scores: dict[str, float] = {}
+    missing = []
+    with _cache_lock:
+        for c in candidates:
+            key = (method, query, c["id"])
+            if key in _cache:
+                _cache.move_to_end(key)
+                scores[c["id"]] = _cache[key]
+            else:
+                missing.append(c)
+    if missing:
+        if not _slots.acquire(blocking=False):
+            return [{**_strip(c), "reranked": False} for c in candidates[:top_k]]
+        future: Future = _executor.submit(_score, method, query, query_embedding, missing)
+        future.add_done_callback(lambda f: _finish(f, method, query, missing))
+        remaining = budget_ms / 1000 - (time.perf_counter() - start)
+        try:
+            new_scores = future.result(timeout=max(0.0, remaining))
+        except TimeoutError:
+            future.cancel()
+            return [{**_strip(c), "reranked": False} for c in candidates[:top_k]]
+        except Exception as e:
+            # A scorer that can't load or run (download, OOM, bad input) mustn't fail the query
+            print(f"Reranking failed, keeping first-stage order: {type(e).__name__}: {e}")
+            return [{**_strip(c), "reranked": False} for c in candidates[:top_k]]
+        scores.update({c["id"]: s for c, s in zip(missing, new_scores)})
+    ranked = sorted(candidates, key=lambda c: scores[c["id"]], reverse=True)
+    return [{**_strip(c), "rerank_score": scores[c["id"]], "reranked": True} for c in ranked[:top_k]]
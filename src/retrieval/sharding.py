@@ -0,0 +1,77 @@
+"""Shard assignment and discovery for the sharded Chroma layout.
+
+Each shard is an independent Chroma directory holding its own text and image
+collections, so shards can be built by separate worker processes and mounted
+together at query time.
+"""
+import zlib
+from pathlib import Path
+from typing import Any
+
+from src.config import EXTRA_SHARD_DIRS, NUM_SHARDS, SHARD_KEY, SHARDS_DIR
+
+UNKNOWN_SHARD = "unknown"
+
+_mounted: dict[str, Path] = {}
+
+
+def is_sharded() -> bool:
+    return SHARD_KEY in ("year", "hash")
+
+
+def shard_for(paper_id: str, metadata: dict[str, Any] | None = None) -> str:
+    """
+    Shard name for a paper. Figures should pass their source paper id so they
+    land in the same shard as the paper they came from.
+    """
+    if SHARD_KEY == "year":
+        year = (metadata or {}).get("year")
+        return str(year) if year else UNKNOWN_SHARD
+    if SHARD_KEY == "hash":
+        return f"h{zlib.crc32(paper_id.encode('utf-8')) % NUM_SHARDS:03d}"
+    return ""
+
+
+def shard_path(shard: str) -> Path:
+    """Directory of a shard: a mounted location if known, else under SHARDS_DIR."""
+    return _mounted.get(shard) or Path(SHARDS_DIR) / shard
+
+
+def _add_shard(shards: dict[str, Path], name: str, path: Path) -> None:
+    existing = shards.get(name)
+    if existing is not None and existing.resolve() != path.resolve():
+        raise ValueError(
+            f"shard name {name!r} is used by both {existing} and {path}; "
+            "mount one of them under another name with mount_shard(path, name)"
+        )
+    shards[name] = path
+
+
+def mount_shard(path: str | Path, name: str | None = None) -> str:
+    """Mount an externally built shard directory. Returns its shard name."""
+    p = Path(path).resolve()
+    shard = name or p.name
+    shards = list_shards()
+    _add_shard(shards, shard, p)
+    _mounted[shard] = p
+    return shard
+
+
+def list_shards() -> dict[str, Path]:
+    """
+    All shards visible to readers: local shards plus mounted ones. Raises
+    ValueError if two different directories would be served under one name.
+    """
+    shards: dict[str, Path] = {}
+    root = Path(SHARDS_DIR)
+    if root.is_dir():
+        for d in sorted(root.iterdir()):
+            if d.is_dir():
+                shards[d.name] = d
+    for extra in EXTRA_SHARD_DIRS:
+        p = Path(extra)
+        if p.is_dir():
+            _add_shard(shards, p.name, p)
+    for name, p in _mounted.items():
+        _add_shard(shards, name, p)
+    return shards
@@ -0,0 +1,310 @@
+"""Portable index snapshots: columnar files + a manifest with model info and checksums.
+
+A snapshot is a directory:
+    manifest.json                    format version, models, per-collection metric/HNSW
+                                     settings and counts, sha256 per file
+    <collection>.embeddings.npy      float32 (N, dim), memory-mappable
+    <collection>.ids.json            list of N ids
+    <collection>.documents.json      list of N documents (text and passage collections)
+    <collection>.metadatas.json      list of N metadata dicts
+    <collection>.bm25.sqlite3        BM25 term counts (text and passage collections)
+
+`SnapshotCollection` serves a snapshot read-only straight from the mmap'd
+embeddings with exact search (metadata filters applied before scoring), so a
+replica needs no Chroma import at all.
+"""
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+from src.config import IMAGE_EMBEDDING_MODEL, TEXT_EMBEDDING_MODEL
+from src.retrieval.filters import matches
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+
+
+class SnapshotError(ValueError):
+    """Snapshot is missing files, fails its checksums, or doesn't match this deployment."""
+
+
+def _sha256(path: Path, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(chunk):
+            h.update(block)
+    return h.hexdigest()
+
+
+def write_collection(
+    out_dir: Path,
+    name: str,
+    count: int,
+    batches: Iterable[dict[str, list]],
+) -> dict[str, Any]:
+    """
+    Write one collection from batches of Chroma `get` results
+    ({"ids", "embeddings", "documents", "metadatas"}). Embeddings are streamed
+    into a .npy preallocated for `count` rows (grown if more arrive); returns
+    the manifest entry for the collection. Raises SnapshotError if the written
+    files don't line up (e.g. records duplicated by paging a changing collection).
+    """
+    ids: list[str] = []
+    documents: list[Optional[str]] = []
+    metadatas: list[dict] = []
+    emb_path = out_dir / f"{name}.embeddings.npy"
+    embeddings = None
+    offset = 0
+    for batch in batches:
+        vecs = np.asarray(batch["embeddings"], dtype=np.float32)
+        if embeddings is None:
+            rows = max(count, len(vecs))
+            embeddings = np.lib.format.open_memmap(emb_path, mode="w+", dtype=np.float32, shape=(rows, vecs.shape[1]))
+        elif offset + len(vecs) > embeddings.shape[0]:
+            # Collection grew after it was counted
+            embeddings = _grow(emb_path, embeddings, offset + len(vecs))
+        embeddings[offset:offset + len(vecs)] = vecs
+        offset += len(vecs)
+        ids.extend(batch["ids"])
+        documents.extend(batch.get("documents") or [None] * len(batch["ids"]))
+        metadatas.extend(batch.get("metadatas") or [{}] * len(batch["ids"]))
+    dim = 0
+    if embeddings is None:
+        np.save(emb_path, np.zeros((0, 0), dtype=np.float32))
+    else:
+        dim = embeddings.shape[1]
+        capacity = embeddings.shape[0]
+        embeddings.flush()
+        del embeddings
+        if offset != capacity:
+            # Collection shrank while exporting; trim to what was actually read
+            np.save(emb_path, np.load(emb_path, mmap_mode="r")[:offset].copy())
+    n_rows = np.load(emb_path, mmap_mode="r").shape[0]
+    if not (n_rows == len(ids) == len(metadatas) == len(documents) == offset):
+        raise SnapshotError(f"{name}: {n_rows} embeddings for {len(ids)} ids")
+    if len(set(ids)) != len(ids):
+        raise SnapshotError(f"{name}: duplicate ids (collection changed while it was read)")
+    files = {
+        "embeddings": emb_path.name,
+        "ids": f"{name}.ids.json",
+        "metadatas": f"{name}.metadatas.json",
+    }
+    (out_dir / files["ids"]).write_text(json.dumps(ids), encoding="utf-8")
+    (out_dir / files["metadatas"]).write_text(json.dumps(metadatas), encoding="utf-8")
+    if any(d is not None for d in documents):
+        files["documents"] = f"{name}.documents.json"
+        (out_dir / files["documents"]).write_text(json.dumps(documents), encoding="utf-8")
+    return {
+        "count": offset,
+        "dim": dim,
+        "files": files,
+        "sha256": {f: _sha256(out_dir / f) for f in files.values()},
+    }
+
+
+def _grow(path: Path, embeddings: np.memmap, rows: int) -> np.memmap:
+    bigger_path = path.with_name(path.name + ".grow")
+    bigger = np.lib.format.open_memmap(
+        bigger_path, mode="w+", dtype=np.float32, shape=(max(rows, 2 * embeddings.shape[0]), embeddings.shape[1])
+    )
+    bigger[: embeddings.shape[0]] = embeddings
+    bigger.flush()
+    del bigger
+    bigger_path.replace(path)
+    return np.lib.format.open_memmap(path, mode="r+")
+
+
+def write_manifest(out_dir: Path, collections: dict[str, dict], extra_files: Optional[list[str]] = None) -> dict:
+    """
+    Write the manifest. Each collection entry carries the "index" settings its
+    records were built with ({"distance_metric", "hnsw_m", "hnsw_construction_ef",
+    "hnsw_search_ef"}), as set by the exporter.
+    """
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "models": {"text": TEXT_EMBEDDING_MODEL, "image": IMAGE_EMBEDDING_MODEL},
+        "collections": collections,
+        "extra_files": {f: _sha256(out_dir / f) for f in extra_files or []},
+    }
+    (out_dir / MANIFEST).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return manifest
+
+
+def read_manifest(snapshot_dir: str | Path, verify: bool = True) -> dict:
+    """Load the manifest, check format/model compatibility and (optionally) file checksums."""
+    root = Path(snapshot_dir)
+    path = root / MANIFEST
+    if not path.exists():
+        raise SnapshotError(f"{root} is not a snapshot (no {MANIFEST})")
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise SnapshotError(f"unsupported snapshot format {manifest.get('format_version')}")
+    models = manifest.get("models", {})
+    if models.get("text") != TEXT_EMBEDDING_MODEL or models.get("image") != IMAGE_EMBEDDING_MODEL:
+        raise SnapshotError(
+            f"snapshot embeddings come from {models}, but this deployment uses "
+            f"text={TEXT_EMBEDDING_MODEL} image={IMAGE_EMBEDDING_MODEL}"
+        )
+    if verify:
+        for name, coll in manifest["collections"].items():
+            for fname, digest in coll["sha256"].items():
+                if not (root / fname).exists():
+                    raise SnapshotError(f"{name}: missing {fname}")
+                if _sha256(root / fname) != digest:
+                    raise SnapshotError(f"{name}: checksum mismatch for {fname}")
+        verify_extra_files(root, manifest)
+    return manifest
+
+
+def collection_index(manifest: dict, name: str) -> dict:
+    """A collection's metric and HNSW settings (older manifests record one set for all collections)."""
+    return manifest["collections"][name].get("index") or manifest["index"]
+
+
+def verify_extra_files(snapshot_dir: str | Path, manifest: dict) -> None:
+    """Check the checksums of the files shipped beside the collections (BM25 indexes)."""
+    root = Path(snapshot_dir)
+    for fname, digest in manifest.get("extra_files", {}).items():
+        if not (root / fname).exists() or _sha256(root / fname) != digest:
+            raise SnapshotError(f"missing or corrupt {fname}")
+
+
+def iter_records(snapshot_dir: str | Path, name: str, manifest: dict, batch_size: int) -> Iterable[dict[str, list]]:
+    """Batches of {"ids", "embeddings", "documents"?, "metadatas"} for bulk loading."""
+    root = Path(snapshot_dir)
+    files = manifest["collections"][name]["files"]
+    embeddings = np.load(root / files["embeddings"], mmap_mode="r")
+    ids = json.loads((root / files["ids"]).read_text(encoding="utf-8"))
+    metadatas = json.loads((root / files["metadatas"]).read_text(encoding="utf-8"))
+    documents = None
+    if "documents" in files:
+        documents = json.loads((root / files["documents"]).read_text(encoding="utf-8"))
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        batch = {
+            "ids": ids[start:end],
+            "embeddings": embeddings[start:end].tolist(),
+            # Chroma rejects empty metadata dicts on some versions
+            "metadatas": [m or None for m in metadatas[start:end]],
+        }
+        if documents is not None:
+            batch["documents"] = documents[start:end]
+        yield batch
+
+
+class SnapshotCollection:
+    """Read-only, Chroma-compatible `count`/`get`/`query` over a mmap'd snapshot collection."""
+
+    def __init__(self, snapshot_dir: str | Path, name: str, manifest: dict):
+        root = Path(snapshot_dir)
+        entry = manifest["collections"][name]
+        files = entry["files"]
+        self.name = name
+        self._space = collection_index(manifest, name)["distance_metric"]
+        self.metadata = {"hnsw:space": self._space}
+        self._embeddings = np.load(root / files["embeddings"], mmap_mode="r")
+        self._ids = json.loads((root / files["ids"]).read_text(encoding="utf-8"))
+        self._metadatas = json.loads((root / files["metadatas"]).read_text(encoding="utf-8"))
+        self._documents = None
+        if "documents" in files:
+            self._documents = json.loads((root / files["documents"]).read_text(encoding="utf-8"))
+        self._norms = None
+        if self._space == "cosine" and len(self._ids):
+            self._norms = np.linalg.norm(self._embeddings, axis=1).clip(1e-12)
+        self._filter_cache: dict[str, np.ndarray] = {}
+        self._row_of: Optional[dict[str, int]] = None
+
+    def _rows_matching(self, where: dict[str, Any]) -> np.ndarray:
+        """Row indices passing a metadata filter (cached per filter)."""
+        key = json.dumps(where, sort_keys=True)
+        rows = self._filter_cache.get(key)
+        if rows is None:
+            rows = np.asarray([i for i, m in enumerate(self._metadatas) if matches(m, where)], dtype=np.int64)
+            if len(self._filter_cache) >= 256:
+                self._filter_cache.clear()
+            self._filter_cache[key] = rows
+        return rows
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def get(
+        self,
+        ids: Optional[list[str]] = None,
+        where: Optional[dict[str, Any]] = None,
+        include: Optional[list[str]] = None,
+        limit: Optional[int] = None,
+    ) -> dict[str, list]:
+        """Records by id and/or matching a metadata filter (no vector search)."""
+        include = include if include is not None else ["documents", "metadatas"]
+        rows = self._rows_matching(where) if where else np.arange(len(self._ids))
+        if ids is not None:
+            if self._row_of is None:
+                self._row_of = {id_: i for i, id_ in enumerate(self._ids)}
+            wanted = np.asarray([self._row_of[i] for i in ids if i in self._row_of], dtype=np.int64)
+            rows = np.intersect1d(rows, wanted) if where else wanted
+        rows = rows[:limit] if limit is not None else rows
+        out: dict[str, list] = {"ids": [self._ids[i] for i in rows]}
+        if "metadatas" in include:
+            out["metadatas"] = [self._metadatas[i] for i in rows]
+        if "documents" in include:
+            out["documents"] = [self._documents[i] if self._documents else None for i in rows]
+        if "embeddings" in include:
+            out["embeddings"] = [self._embeddings[i].tolist() for i in rows]
+        return out
+
+    def _distances(self, q: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        # Same distance definitions as Chroma's HNSW spaces
+        emb = self._embeddings if rows is None else self._embeddings[rows]
+        if self._space == "cosine":
+            norms = self._norms if rows is None else self._norms[rows]
+            return 1.0 - (emb @ q) / (norms * max(np.linalg.norm(q), 1e-12))
+        if self._space == "ip":
+            return 1.0 - emb @ q
+        diff = emb - q
+        return np.einsum("ij,ij->i", diff, diff)
+
+    def query(
+        self,
+        query_embeddings: list[list[float]],
+        n_results: int = 10,
+        include: Optional[list[str]] = None,
+        where: Optional[dict[str, Any]] = None,
+    ) -> dict[str, list]:
+        include = include if include is not None else ["documents", "metadatas", "distances"]
+        out: dict[str, list] = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        # Filter first so only matching rows are scored
+        rows = self._rows_matching(where) if where else None
+        for qe in query_embeddings:
+            dist = self._distances(np.asarray(qe, dtype=np.float32), rows)
+            k = min(n_results, len(dist))
+            top = np.argpartition(dist, k - 1)[:k] if k else np.array([], dtype=int)
+            top = top[np.argsort(dist[top])]
+            out["distances"].append([float(d) for d in dist[top]])
+            if rows is not None:
+                top = rows[top]
+            out["ids"].append([self._ids[i] for i in top])
+            out["metadatas"].append([self._metadatas[i] for i in top])
+            out["documents"].append([self._documents[i] if self._documents else None for i in top])
+            out["embeddings"].append([self._embeddings[i].tolist() for i in top] if "embeddings" in include else [])
+        return {k: v for k, v in out.items() if k == "ids" or k in include}
+
+
+def open_snapshot(snapshot_dir: str | Path, collection_names: tuple[str, ...], verify: bool = False):
+    """
+    SnapshotCollections for a read-only deployment, in order; None for collections
+    the snapshot lacks. The BM25 files are always checked against their checksums;
+    `verify` also checks the (much larger) collection files.
+    """
+    manifest = read_manifest(snapshot_dir, verify=verify)
+    if not verify:
+        verify_extra_files(snapshot_dir, manifest)
+    return tuple(
+        SnapshotCollection(snapshot_dir, name, manifest) if name in manifest["collections"] else None
+        for name in collection_names
+    )
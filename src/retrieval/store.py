@@ -1,32 +1,336 @@
 """ChromaDB collections for text and image embeddings."""
+import threading
+from collections import defaultdict
+from contextlib import nullcontext
 from pathlib import Path
 from typing import Any
 
 import chromadb
 from chromadb.config import Settings
 
-from src.config import CHROMA_DIR, DEFAULT_TOP_K_IMAGES, DEFAULT_TOP_K_TEXT
+from src.config import (
+    CHROMA_DIR,
+    DEFAULT_TOP_K_IMAGES,
+    DEFAULT_TOP_K_TEXT,
+    DISTANCE_METRIC,
+    HNSW_CONSTRUCTION_EF,
+    HNSW_M,
+    HNSW_SEARCH_EF,
+    INDEX_SNAPSHOT_DIR,
+)
+from src.retrieval.lexical import LexicalIndex, edit_lexical_index, get_lexical_index
+from src.retrieval.sharding import is_sharded, list_shards, shard_for, shard_path
+from src.retrieval.snapshot import open_snapshot
 
 TEXT_COLLECTION_NAME = "medical_papers"
 IMAGE_COLLECTION_NAME = "medical_images"
+PASSAGE_COLLECTION_NAME = "medical_passages"
+COLLECTION_DESCRIPTIONS = {
+    TEXT_COLLECTION_NAME: "Paper abstracts",
+    IMAGE_COLLECTION_NAME: "Paper figures",
+    PASSAGE_COLLECTION_NAME: "Abstract and methods passages",
+}
 
-_client: chromadb.PersistentClient | None = None
+_clients: dict[str, chromadb.PersistentClient] = {}
+_collections: dict[tuple[str, str], Any] = {}
+_snapshot_collections: tuple[Any, ...] | None = None
+# Guards the caches above: the query service calls in from several threads at once
+_cache_lock = threading.RLock()
 
 
-def get_client() -> chromadb.PersistentClient:
-    global _client
-    if _client is None:
-        Path(CHROMA_DIR).mkdir(parents=True, exist_ok=True)
-        _client = chromadb.PersistentClient(path=CHROMA_DIR, settings=Settings(anonymized_telemetry=False))
-    return _client
+def _path_key(path: str | Path | None) -> str:
+    return str(Path(path or CHROMA_DIR))
 
 
-def get_or_create_collections():
-    """Get or create text and image collections."""
-    client = get_client()
-    text_coll = client.get_or_create_collection(TEXT_COLLECTION_NAME, metadata={"description": "Paper abstracts"})
-    image_coll = client.get_or_create_collection(IMAGE_COLLECTION_NAME, metadata={"description": "Paper figures"})
-    return text_coll, image_coll
+def get_client(path: str | Path | None = None) -> chromadb.PersistentClient:
+    """Cached persistent client for a Chroma directory (default CHROMA_DIR)."""
+    key = _path_key(path)
+    with _cache_lock:
+        if key not in _clients:
+            Path(key).mkdir(parents=True, exist_ok=True)
+            _clients[key] = chromadb.PersistentClient(path=key, settings=Settings(anonymized_telemetry=False))
+        return _clients[key]
+
+
+def hnsw_metadata(
+    space: str = DISTANCE_METRIC,
+    m: int = HNSW_M,
+    construction_ef: int = HNSW_CONSTRUCTION_EF,
+    search_ef: int = HNSW_SEARCH_EF,
+) -> dict[str, Any]:
+    """Chroma collection metadata selecting the distance metric and HNSW parameters."""
+    return {
+        "hnsw:space": space,
+        "hnsw:M": m,
+        "hnsw:construction_ef": construction_ef,
+        "hnsw:search_ef": search_ef,
+    }
+
+
+def _collection(path: str | Path | None, name: str):
+    """Cached get-or-create of one collection, so queries don't hit the catalog per shard."""
+    key = (_path_key(path), name)
+    coll = _collections.get(key)
+    if coll is None:
+        with _cache_lock:
+            coll = _collections.get(key)
+            if coll is None:
+                coll = _collections[key] = get_client(path).get_or_create_collection(
+                    name, metadata={"description": COLLECTION_DESCRIPTIONS[name], **hnsw_metadata()}
+                )
+    return coll
+
+
+def get_or_create_collections(path: str | Path | None = None):
+    """
+    Get or create text and image collections (in `path`, default CHROMA_DIR).
+    New collections use the configured metric and HNSW parameters; existing ones
+    keep theirs until migrated with `migrate_collections`.
+    """
+    return _collection(path, TEXT_COLLECTION_NAME), _collection(path, IMAGE_COLLECTION_NAME)
+
+
+def get_passage_collection(path: str | Path | None = None):
+    """Get or create the passage (chunk) collection (in `path`, default CHROMA_DIR)."""
+    return _collection(path, PASSAGE_COLLECTION_NAME)
+
+
+def index_settings(coll) -> dict[str, Any]:
+    """A collection's effective metric and HNSW settings, keyed like `hnsw_metadata()`."""
+    hnsw = (getattr(coll, "configuration_json", None) or {}).get("hnsw") or {}
+    meta = coll.metadata or {}
+    # Older Chroma has no configuration_json; collections created before these
+    # settings existed then used its defaults (L2 space, M=16, ef 100/10)
+    return {
+        "hnsw:space": hnsw.get("space", meta.get("hnsw:space", "l2")),
+        "hnsw:M": hnsw.get("max_neighbors", meta.get("hnsw:M", 16)),
+        "hnsw:construction_ef": hnsw.get("ef_construction", meta.get("hnsw:construction_ef", 100)),
+        "hnsw:search_ef": hnsw.get("ef_search", meta.get("hnsw:search_ef", 10)),
+    }
+
+
+def needs_migration(coll) -> bool:
+    """
+    True if a collection's metric or HNSW graph settings (M, construction_ef)
+    differ from the configured ones. These are fixed when the graph is built;
+    search_ef is not (see `set_search_ef`).
+    """
+    current = index_settings(coll)
+    return any(current[k] != v for k, v in hnsw_metadata().items() if k != "hnsw:search_ef")
+
+
+def set_search_ef(coll, search_ef: int = HNSW_SEARCH_EF) -> bool:
+    """Change a collection's query-time ef in place. Returns False on Chroma versions that can't (pre-1.x)."""
+    if index_settings(coll)["hnsw:search_ef"] == search_ef:
+        return True
+    try:
+        coll.modify(configuration={"hnsw": {"ef_search": search_ef}})
+    except TypeError:
+        return False
+    return True
+
+
+def _existing(client, name: str):
+    try:
+        return client.get_collection(name)
+    except Exception:
+        return None
+
+
+def _copy_records(src, dst, batch_size: int) -> None:
+    total = src.count()
+    for offset in range(0, total, batch_size):
+        batch = src.get(offset=offset, limit=batch_size, include=["embeddings", "documents", "metadatas"])
+        if not batch["ids"]:
+            break
+        records = {"ids": batch["ids"], "embeddings": batch["embeddings"], "metadatas": batch["metadatas"]}
+        # Image collections have no documents
+        if batch["documents"] and any(d is not None for d in batch["documents"]):
+            records["documents"] = batch["documents"]
+        dst.upsert(**records)
+
+
+def _finish_migration(client, name: str, batch_size: int) -> bool:
+    """
+    Complete or roll back an interrupted migration of `name`. Returns True if
+    a staged collection was promoted to `name`.
+    """
+    staged = _existing(client, f"{name}__migrating")
+    retired = _existing(client, f"{name}__retired")
+    if retired is None:
+        # Interrupted while copying: the live collection is untouched, start over
+        if staged is not None:
+            client.delete_collection(staged.name)
+        return False
+    live = _existing(client, name)
+    if staged is not None:
+        # The old collection was already moved aside, so the staged copy is complete.
+        # A collection created under the live name in between (by a reader's
+        # get-or-create, or a writer) is folded into it.
+        if live is not None:
+            _copy_records(live, staged, batch_size)
+            client.delete_collection(name)
+        staged.modify(name=name)
+        client.delete_collection(retired.name)
+        return True
+    if live is None:
+        retired.modify(name=name)
+    else:
+        client.delete_collection(retired.name)
+    return False
+
+
+def migrate_collections(path: str | Path | None = None, batch_size: int = 1000) -> list[str]:
+    """
+    Bring collections in line with the configured metric and HNSW settings.
+    A search_ef change is applied in place. Otherwise records (ids, embeddings, documents, metadatas) are copied in batches into a
+    staged collection; the old one is then renamed aside, the staged one takes
+    its name, and only then is the old one deleted, so the name never points at
+    a partial collection. Migrations interrupted by a crash are finished on the
+    next run. Stop writers (watcher, build_index) while migrating: records
+    written after the copy are not carried over. Returns migrated names.
+    """
+    client = get_client(path)
+    migrated = []
+    for name, description in COLLECTION_DESCRIPTIONS.items():
+        if _finish_migration(client, name, batch_size):
+            _collections.pop((_path_key(path), name), None)
+            migrated.append(name)
+        old = client.get_or_create_collection(name, metadata={"description": description, **hnsw_metadata()})
+        if not needs_migration(old):
+            if index_settings(old)["hnsw:search_ef"] == HNSW_SEARCH_EF:
+                continue
+            # Older Chroma fixes search_ef at creation too; the collection is then rebuilt below
+            if set_search_ef(old):
+                _collections.pop((_path_key(path), name), None)
+                migrated.append(name)
+                continue
+        staged = client.create_collection(f"{name}__migrating", metadata={"description": description, **hnsw_metadata()})
+        _copy_records(old, staged, batch_size)
+        old.modify(name=f"{name}__retired")
+        _finish_migration(client, name, batch_size)
+        _collections.pop((_path_key(path), name), None)
+        migrated.append(name)
+    return migrated
+
+
+def reopen_collection(coll):
+    """
+    Fresh handle for a cached collection that no longer exists (replaced by a
+    migration, possibly in another process). Raises LookupError for handles
+    this module didn't hand out.
+    """
+    with _cache_lock:
+        for key, cached in list(_collections.items()):
+            if cached is coll:
+                del _collections[key]
+                return _collection(*key)
+    raise LookupError(f"{getattr(coll, 'name', coll)!r} is not a cached collection")
+
+
+def get_shard_collections(shard: str):
+    """Text and image collections of one shard."""
+    return get_or_create_collections(shard_path(shard))
+
+
+def iter_collections() -> list[tuple[Any, Any]]:
+    """
+    (text, image) collection pairs to query: a read-only snapshot if
+    INDEX_SNAPSHOT_DIR is set, else every mounted shard, else the single store.
+    """
+    if INDEX_SNAPSHOT_DIR:
+        return [_open_snapshot()[:2]]
+    if not is_sharded():
+        return [get_or_create_collections()]
+    return [get_or_create_collections(p) for p in list_shards().values()]
+
+
+def iter_passage_collections() -> list[Any]:
+    """Passage collections to query, from the same source as `iter_collections`."""
+    if INDEX_SNAPSHOT_DIR:
+        passages = _open_snapshot()[2]
+        return [passages] if passages is not None else []
+    if not is_sharded():
+        return [get_passage_collection()]
+    return [get_passage_collection(p) for p in list_shards().values()]
+
+
+def _open_snapshot() -> tuple[Any, ...]:
+    global _snapshot_collections
+    if _snapshot_collections is None:
+        with _cache_lock:
+            if _snapshot_collections is None:
+                _snapshot_collections = open_snapshot(
+                    INDEX_SNAPSHOT_DIR, (TEXT_COLLECTION_NAME, IMAGE_COLLECTION_NAME, PASSAGE_COLLECTION_NAME)
+                )
+    return _snapshot_collections
+
+
+def _store_paths() -> list[Path]:
+    return list(list_shards().values()) if is_sharded() else [Path(CHROMA_DIR)]
+
+
+def _lexical_source(path: Path, collection_name: str):
+    """The Chroma collection a BM25 index in `path` covers."""
+    if collection_name == PASSAGE_COLLECTION_NAME:
+        return get_passage_collection(path)
+    return get_or_create_collections(path)[0]
+
+
+def iter_lexical_indexes(collection_name: str) -> list[tuple[Any, Any]]:
+    """
+    (BM25 index, collection) pairs for a text or passage collection, one per
+    directory `iter_collections` reads from; texts for BM25 hits come from the
+    paired collection.
+    """
+    if INDEX_SNAPSHOT_DIR:
+        # Opening the snapshot first verifies the index file's checksum
+        text, _, passages = _open_snapshot()
+        coll = text if collection_name == TEXT_COLLECTION_NAME else passages
+        return [(get_lexical_index(INDEX_SNAPSHOT_DIR, collection_name, readonly=True), coll)] if coll is not None else []
+    return [(get_lexical_index(p, collection_name), _lexical_source(p, collection_name)) for p in _store_paths()]
+
+
+def rebuild_lexical_indexes(batch_size: int = 1000) -> None:
+    """Rebuild every BM25 index from the documents stored in Chroma (e.g. after upgrading the index format)."""
+    for path in _store_paths():
+        for name in (TEXT_COLLECTION_NAME, PASSAGE_COLLECTION_NAME):
+            coll = _lexical_source(path, name)
+            with edit_lexical_index(path, name) as lexical:
+                lexical.delete_where({})
+                for offset in range(0, coll.count(), batch_size):
+                    batch = coll.get(offset=offset, limit=batch_size, include=["documents", "metadatas"])
+                    lexical.upsert(batch["ids"], batch["documents"], batch["metadatas"])
+
+
+def copy_lexical_index(source: LexicalIndex, collection_name: str) -> None:
+    """
+    Write the documents of a BM25 index built elsewhere (a snapshot's) into this
+    store's indexes, routed like `add_*_to_store`, one transaction per touched
+    index. For passages, a paper's chunks the source doesn't have are deleted.
+    """
+    ids = list(source.doc_terms)
+    metadatas = [source.metadatas[d] for d in ids]
+    if not ids:
+        return
+    for name, idx in _route(ids, metadatas, "source", None).items():
+        path = shard_path(name) if name else Path(CHROMA_DIR)
+        with edit_lexical_index(path, collection_name) as index:
+            if collection_name == PASSAGE_COLLECTION_NAME:
+                index.delete_where({"source": {"$in": sorted({metadatas[i]["source"] for i in idx})}})
+            index.upsert_terms(
+                [ids[i] for i in idx], [source.doc_terms[ids[i]] for i in idx], [metadatas[i] for i in idx]
+            )
+
+
+def _route(ids: list[str], metadatas: list[dict[str, Any]], key: str, shard: str | None) -> dict[str, list[int]]:
+    """Group record positions by target shard ("" when unsharded), keyed on a paper-id metadata field."""
+    if not is_sharded():
+        return {"": list(range(len(ids)))}
+    groups: dict[str, list[int]] = defaultdict(list)
+    for i, (id_, meta) in enumerate(zip(ids, metadatas)):
+        groups[shard or shard_for(meta.get(key, id_), meta)].append(i)
+    return groups
 
 
 def add_papers_to_store(
@@ -34,19 +338,90 @@ def add_papers_to_store(
     texts: list[str],
     embeddings: list[list[float]],
     metadatas: list[dict[str, Any]] | None = None,
+    shard: str | None = None,
+    lexical: bool = True,
 ) -> None:
-    """Upsert papers into the text collection."""
-    text_coll, _ = get_or_create_collections()
+    """
+    Upsert papers into the text collection and its BM25 index. When sharding is
+    enabled, papers are routed to their shard unless `shard` pins them all to one.
+    Each touched BM25 index is committed together with its Chroma upsert;
+    `lexical=False` leaves the BM25 indexes to the caller (see `copy_lexical_index`).
+    """
     if metadatas is None:
         metadatas = [{}] * len(ids)
-    text_coll.upsert(ids=ids, documents=texts, embeddings=embeddings, metadatas=metadatas)
+    for name, idx in _route(ids, metadatas, "source", shard).items():
+        path = shard_path(name) if name else Path(CHROMA_DIR)
+        text_coll, _ = get_or_create_collections(path)
+        with edit_lexical_index(path, TEXT_COLLECTION_NAME) if lexical else nullcontext() as index:
+            if index is not None:
+                index.upsert([ids[i] for i in idx], [texts[i] for i in idx], [metadatas[i] for i in idx])
+            text_coll.upsert(
+                ids=[ids[i] for i in idx],
+                documents=[texts[i] for i in idx],
+                embeddings=[embeddings[i] for i in idx],
+                metadatas=[metadatas[i] for i in idx],
+            )
+
+
+def add_passages_to_store(
+    ids: list[str],
+    texts: list[str],
+    embeddings: list[list[float]],
+    metadatas: list[dict[str, Any]],
+    shard: str | None = None,
+    lexical: bool = True,
+) -> None:
+    """
+    Upsert passages (metadata must carry "source", "chunk" and "n_chunks") into
+    the passage collection and its BM25 index (unless `lexical=False`). Chunks
+    left over from a previous, longer version of a paper are deleted from both.
+    """
+    for name, idx in _route(ids, metadatas, "source", shard).items():
+        path = shard_path(name) if name else Path(CHROMA_DIR)
+        coll = get_passage_collection(path)
+        with edit_lexical_index(path, PASSAGE_COLLECTION_NAME) if lexical else nullcontext() as index:
+            if index is not None:
+                index.upsert([ids[i] for i in idx], [texts[i] for i in idx], [metadatas[i] for i in idx])
+            coll.upsert(
+                ids=[ids[i] for i in idx],
+                documents=[texts[i] for i in idx],
+                embeddings=[embeddings[i] for i in idx],
+                metadatas=[metadatas[i] for i in idx],
+            )
+            n_chunks = {metadatas[i]["source"]: metadatas[i]["n_chunks"] for i in idx}
+            for source, n in n_chunks.items():
+                stale = {"$and": [{"source": source}, {"chunk": {"$gte": n}}]}
+                coll.delete(where=stale)
+                if index is not None:
+                    index.delete_where(stale)
+
+
+def delete_stale_figures(
+    source_paper: str,
+    keep_ids: list[str],
+    metadata: dict[str, Any] | None = None,
+    shard: str | None = None,
+) -> None:
+    """Delete a paper's indexed figures whose ids aren't in `keep_ids` (left over from an earlier extraction)."""
+    name = (shard or shard_for(source_paper, metadata)) if is_sharded() else ""
+    _, image_coll = get_shard_collections(name) if name else get_or_create_collections()
+    existing = image_coll.get(where={"source_paper": source_paper}, include=[])["ids"]
+    stale = sorted(set(existing) - set(keep_ids))
+    if stale:
+        image_coll.delete(ids=stale)
 
 
 def add_images_to_store(
     ids: list[str],
     embeddings: list[list[float]],
     metadatas: list[dict[str, Any]],
+    shard: str | None = None,
 ) -> None:
-    """Upsert image embeddings (no documents)."""
-    _, image_coll = get_or_create_collections()
-    image_coll.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas)
+    """Upsert image embeddings (no documents), co-located with their source paper's shard."""
+    for name, idx in _route(ids, metadatas, "source_paper", shard).items():
+        _, image_coll = get_shard_collections(name) if name else get_or_create_collections()
+        image_coll.upsert(
+            ids=[ids[i] for i in idx],
+            embeddings=[embeddings[i] for i in idx],
+            metadatas=[metadatas[i] for i in idx],
+        )
@@ -0,0 +1,8 @@
+from .query_service import QueryService, ServiceOverloaded, answer_blocking, get_service
+
+__all__ = [
+    "QueryService",
+    "ServiceOverloaded",
+    "answer_blocking",
+    "get_service",
+]
@@ -0,0 +1,183 @@
+"""Async query service: retrieval + generation with bounded concurrency per stage."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from PIL import Image
+
+from src.config import (
+    DEFAULT_TOP_K_IMAGES,
+    DEFAULT_TOP_K_TEXT,
+    INDEX_SNAPSHOT_DIR,
+    RERANK_ENABLED,
+    RERANKER,
+    SERVICE_ADMISSION_TIMEOUT,
+    SERVICE_GENERATION_CONCURRENCY,
+    SERVICE_MAX_PENDING,
+    SERVICE_RETRIEVAL_CONCURRENCY,
+    SERVICE_WATCH_PAPERS,
+)
+
+
+class ServiceOverloaded(RuntimeError):
+    """Raised when a request cannot be admitted within the admission timeout."""
+
+
+class QueryService:
+    """
+    Wraps `process_query` and `generate_response` for concurrent callers.
+
+    Each stage has its own concurrency limit, and at most `max_pending` requests
+    may be in the service at once; beyond that, callers wait up to
+    `admission_timeout` seconds and then get `ServiceOverloaded` (backpressure)
+    instead of growing an unbounded queue. Blocking stage functions run on a
+    thread pool sized to the stage limits.
+
+    When reranking with the cross-encoder, the model is loaded up front so the
+    first requests don't all fall back while it loads.
+
+    With `watch_papers`, the service also runs the PAPERS_DIR watcher on its own
+    threads, so papers it indexes are searchable by this process right away.
+    """
+
+    def __init__(
+        self,
+        retrieve: Optional[Callable[..., dict[str, Any]]] = None,
+        generate: Optional[Callable[..., str]] = None,
+        retrieval_concurrency: int = SERVICE_RETRIEVAL_CONCURRENCY,
+        generation_concurrency: int = SERVICE_GENERATION_CONCURRENCY,
+        max_pending: int = SERVICE_MAX_PENDING,
+        admission_timeout: float = SERVICE_ADMISSION_TIMEOUT,
+        watch_papers: bool = SERVICE_WATCH_PAPERS,
+    ):
+        if retrieve is None:
+            from src.retrieval import process_query as retrieve
+
+            if RERANK_ENABLED and RERANKER == "cross-encoder":
+                from src.retrieval.rerank import load_reranker
+
+                try:
+                    load_reranker()
+                except Exception as e:
+                    print(f"Could not load the reranker, serving first-stage order: {type(e).__name__}: {e}")
+        if generate is None:
+            from src.llm import generate_response as generate
+        self._retrieve = retrieve
+        self._generate = generate
+        self._retrieval_concurrency = retrieval_concurrency
+        self._generation_concurrency = generation_concurrency
+        self._max_pending = max_pending
+        self._admission_timeout = admission_timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=retrieval_concurrency + generation_concurrency,
+            thread_name_prefix="query-service",
+        )
+        # Semaphores are created lazily so they bind to the loop that serves requests
+        self._admission: asyncio.Semaphore | None = None
+        self._retrieval_slots: asyncio.Semaphore | None = None
+        self._generation_slots: asyncio.Semaphore | None = None
+        self.in_flight = 0
+        self.rejected = 0
+        self.watcher = None
+        if watch_papers and not INDEX_SNAPSHOT_DIR:
+            from src.indexing import PaperWatcher
+
+            self.watcher = PaperWatcher()
+            self.watcher.start()
+
+    def _ensure_semaphores(self) -> None:
+        if self._admission is None:
+            self._admission = asyncio.Semaphore(self._max_pending)
+            self._retrieval_slots = asyncio.Semaphore(self._retrieval_concurrency)
+            self._generation_slots = asyncio.Semaphore(self._generation_concurrency)
+
+    async def _run_stage(self, slots: asyncio.Semaphore, fn: Callable, *args, **kwargs):
+        async with slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+
+    async def answer(
+        self,
+        query: Optional[str] = None,
+        query_image: Optional[Image.Image] = None,
+        top_k_text: int = DEFAULT_TOP_K_TEXT,
+        top_k_images: int = DEFAULT_TOP_K_IMAGES,
+        generate: bool = True,
+        where: Optional[dict[str, Any]] = None,
+    ) -> dict[str, Any]:
+        """
+        Retrieve, then (for text queries with results) generate an answer.
+        `where` is passed through to `process_query` as a metadata filter.
+        Returns {"text_results", "image_results", "answer", "timings"}.
+        """
+        self._ensure_semaphores()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._admission.acquire(), timeout=self._admission_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise ServiceOverloaded(f"more than {self._max_pending} requests in flight") from None
+        self.in_flight += 1
+        try:
+            admitted = time.perf_counter()
+            results = await self._run_stage(
+                self._retrieval_slots,
+                self._retrieve,
+                query=query,
+                query_image=query_image,
+                top_k_text=top_k_text,
+                top_k_images=top_k_images,
+                **({"where": where} if where else {}),
+            )
+            retrieved = time.perf_counter()
+            text_results = results.get("text_results", [])
+            image_results = results.get("image_results", [])
+            answer = None
+            if generate and query and (text_results or image_results):
+                answer = await self._run_stage(
+                    self._generation_slots, self._generate, query, text_results, image_results
+                )
+            done = time.perf_counter()
+            return {
+                "text_results": text_results,
+                "image_results": image_results,
+                "answer": answer,
+                "timings": {
+                    "admission_s": admitted - start,
+                    "retrieval_s": retrieved - admitted,
+                    "generation_s": done - retrieved,
+                    "total_s": done - start,
+                },
+            }
+        finally:
+            self.in_flight -= 1
+            self._admission.release()
+
+    def close(self) -> None:
+        if self.watcher is not None:
+            self.watcher.stop()
+        self._executor.shutdown(wait=False)
+
+
+_service: QueryService | None = None
+_loop: asyncio.AbstractEventLoop | None = None
+_lock = threading.Lock()
+
+
+def get_service() -> tuple[QueryService, asyncio.AbstractEventLoop]:
+    """Process-wide service running on a background event loop thread."""
+    global _service, _loop
+    with _lock:
+        if _service is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="query-service-loop", daemon=True).start()
+            _service = QueryService()
+    return _service, _loop  # type: ignore
+
+
+def answer_blocking(**kwargs) -> dict[str, Any]:
+    """Submit a request to the shared service from synchronous code (e.g. Streamlit)."""
+    service, loop = get_service()
+    return asyncio.run_coroutine_threadsafe(service.answer(**kwargs), loop).result()